@@ -0,0 +1,9 @@
+"""Parser throughput benchmarks.
+
+    python -m benchmarks.generate --races 50 --birds 1000 -o /tmp/league.txt
+    python -m benchmarks.run                   # run all cases and print a report
+    python -m benchmarks.run --check           # fail if slower than baseline.json
+    python -m benchmarks.run --save-baseline   # record the current numbers
+
+Run from the backend_python directory.
+"""
@@ -0,0 +1,100 @@
+"""Synthetic Data Technology Deerlijk result file generator"""
+import argparse
+import random
+import sys
+from typing import Iterator, List, Tuple
+
+SEPARATOR = '-' * 85
+COLUMN_HEADER = '  NR Naam                  Gemeent AD IG Afstand LD Ring   JR Bestat     Snelh.    NR'
+COLUMN_HEADER_FR = '  N0 Nom                   Localit EN MQ Distanc PA Bague  AN Constat    Vitesse   NO'
+
+RACE_POINTS = ['CHIMAY', 'QUIEVRAIN', 'Mettet', 'NOYON', 'SOURDUN', 'CHATEAUROUX', 'BOURGES', 'ARGENTON']
+CATEGORIES = ['Jongen', 'Oude+jaarse']
+SURNAMES = ['VRANCKEN', 'BRIERS', 'HERMANS', 'RANSON', 'LENAERTS', 'JORDENS', 'MEYNEN', 'VANGEEL',
+            'BIELEN', 'KNUTS', 'MONDELAERS', 'VANSPAUWEN', 'LARBIE', 'DAS', 'VANDENBROECK']
+FIRST_NAMES = ['WILLY', 'VALENT.', 'RUBEN', 'STEVEN', 'ADOLF', 'GUIDO', 'RUDI', 'JO', 'TONY',
+               'ROGER', 'RONNY', 'JOS', 'MARIE-LOUISE']
+SUFFIXES = ['', '', '', '&ZN', '&DOCHTER', ' & ZONEN', '-TIREZ', ' - LUYTEN']
+CITIES = ['KURINGE', 'KERMT', 'HASSELT', 'HEUSDEN', 'LUMMEN', 'STEVOORT', 'SPALBEEK']
+
+
+def make_fanciers(rng: random.Random, count: int) -> List[Tuple[str, str, int]]:
+    """(name, city, distance in meters) per fancier; names are cut at the 21 column width"""
+    fanciers = []
+    for _ in range(count):
+        name = f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}{rng.choice(SUFFIXES)}"
+        fanciers.append((name[:21], rng.choice(CITIES), rng.randint(80000, 130000)))
+    return fanciers
+
+
+def generate_race(rng: random.Random, birds: int, fanciers: List[Tuple[str, str, int]]) -> Iterator[str]:
+    """Yield the lines of one race section"""
+    entered = birds * rng.randint(2, 4)
+    yield 'De Pijl Kermt Kermt                           Data Technology Deerlijk  (55083)'
+    yield SEPARATOR
+    yield (f"{rng.choice(RACE_POINTS):<20} {rng.randint(1, 28):02d}-{rng.randint(4, 9):02d}-25  "
+           f"{entered} {rng.choice(CATEGORIES):<16} Deelnemers:{len(fanciers)} LOSTIJD:08.20")
+    yield SEPARATOR
+    yield COLUMN_HEADER
+    yield COLUMN_HEADER_FR
+    yield SEPARATOR
+
+    # The Afstand column holds the distance on a fancier's first bird and a
+    # running count ("ditto") on the following ones
+    birds_clocked = {}
+    speed = rng.uniform(1400.0, 1600.0)
+    for position in range(1, birds + 1):
+        name, city, distance = rng.choice(fanciers)
+        count = birds_clocked.get((name, city), 0) + 1
+        birds_clocked[(name, city)] = count
+        afstand = distance if count == 1 else count
+        speed -= rng.uniform(0.0, 0.5)
+        minutes = distance / speed
+        clocked = 8 * 60 + 20 + minutes
+        time = f"{int(clocked // 60):02d}.{int(clocked % 60):02d}{int((clocked % 1) * 600):03d}"
+        ring = f"{rng.randint(5000000, 5099999)}{rng.randint(19, 25)}"
+        yield (f"{position:>4} {name:<21} {city[:7]:<7} {count:>2} {rng.randint(1, 40):>2} {afstand:>7} "
+               f"BE {ring:<9} {time:<8} {speed:>9.4f} {position:>4}")
+    yield SEPARATOR
+    yield ''
+
+
+def generate_file(races: int, birds: int, seed: int = 55083) -> Iterator[str]:
+    """Yield the lines of a multi-race Deerlijk file (1-5000 races, up to 5000 birds each)"""
+    rng = random.Random(seed)
+    fanciers = make_fanciers(rng, max(birds // 10, 5))
+    for _ in range(races):
+        yield from generate_race(rng, birds, fanciers)
+
+
+def write_file(path: str, races: int, birds: int, seed: int = 55083) -> int:
+    """Write a generated file, returns the number of lines written"""
+    lines = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in generate_file(races, birds, seed):
+            f.write(line + '\n')
+            lines += 1
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--races', type=int, default=10, help='number of races (1-5000)')
+    parser.add_argument('--birds', type=int, default=500, help='birds clocked per race (up to 5000)')
+    parser.add_argument('--seed', type=int, default=55083)
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.races <= 5000 or not 1 <= args.birds <= 5000:
+        parser.error('--races must be 1-5000 and --birds 1-5000')
+
+    if args.output:
+        lines = write_file(args.output, args.races, args.birds, args.seed)
+        print(f"Wrote {lines} lines to {args.output}", file=sys.stderr)
+    else:
+        for line in generate_file(args.races, args.birds, args.seed):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Parser throughput benchmark runner.
+
+Each case generates a synthetic Deerlijk file, then parses it in a fresh process
+so peak RSS is not polluted by earlier cases. Reported per case:
+
+- lines_per_sec: best of --repeat runs of the parse path (see PARSE_PATHS)
+- peak_rss_mb: peak resident set size of the parsing process
+- allocs_per_line: memory blocks still allocated by the parsed output, per line
+- peak_traced_bytes_per_line: tracemalloc peak during parsing, per line
+
+Baseline numbers are machine dependent, record them on the box that runs the check.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Any
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.generate import write_file  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+CASES = {
+    'single_race': {'races': 1, 'birds': 500},
+    'league_week': {'races': 50, 'birds': 1000},
+    'season_archive': {'races': 400, 'birds': 250},
+    'big_race': {'races': 2, 'birds': 5000},
+    'upload_league_week': {'races': 50, 'birds': 1000, 'path': 'upload'},
+    'upload_season_archive': {'races': 400, 'birds': 250, 'path': 'upload'},
+}
+
+
+def parse_file(content: str) -> list:
+    from race_parser import parse_race_file
+
+    return parse_race_file(content)['races']
+
+
+def parse_upload(content: str) -> list:
+    """What the upload endpoint runs in its workers: columnar blocks, section by section"""
+    from race_parser import detect_format, iter_sections, parse_section
+
+    parser_cls = detect_format(content)
+    return [block for section in iter_sections(content.split('\n'), parser_cls)
+            for block in parse_section(section, parser_cls.name, columnar=True)]
+
+
+# Parse functions by case 'path', each returns the race blocks of a file
+PARSE_PATHS = {'file': parse_file, 'upload': parse_upload}
+
+# Metrics where a bigger number is a regression
+HIGHER_IS_WORSE = {'peak_rss_mb', 'allocs_per_line', 'peak_traced_bytes_per_line'}
+
+
+def measure_file(path: str, repeat: int, parse_path: str = 'file') -> Dict[str, Any]:
+    """Parse the file and collect the metrics (runs in the child process)"""
+    from race_parser import count_results
+
+    parse = PARSE_PATHS[parse_path]
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    lines = content.count('\n') + 1
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = parse(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del parsed
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    parsed = parse(content)
+    after = tracemalloc.take_snapshot()
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocs = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    return {
+        'lines': lines,
+        'results': sum(count_results(block) for block in parsed),
+        'seconds': round(best, 4),
+        'lines_per_sec': round(lines / best),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'allocs_per_line': round(allocs / lines, 2),
+        'peak_traced_bytes_per_line': round(peak_traced / lines, 1),
+    }
+
+
+def run_case(races: int, birds: int, repeat: int, path: str = 'file') -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, 'results.txt')
+        write_file(file_path, races, birds)
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(1) as pool:
+            return pool.apply(measure_file, (file_path, repeat, path))
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> list:
+    """Return a list of regression messages against the stored baseline"""
+    regressions = []
+    for case, metrics in results.items():
+        expected = baseline.get(case)
+        if not expected:
+            continue
+        for metric, base_value in expected.items():
+            if metric not in metrics or metric in ('lines', 'results', 'seconds'):
+                continue
+            value = metrics[metric]
+            if metric in HIGHER_IS_WORSE:
+                worse = value > base_value * (1 + tolerance)
+            else:
+                worse = value < base_value * (1 - tolerance)
+            if worse:
+                regressions.append(f"{case}: {metric} {value} vs baseline {base_value}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark result file parsing throughput')
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help='case(s) to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case, the best one counts')
+    parser.add_argument('--check', action='store_true', help='exit non-zero on a regression against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown for --check')
+    parser.add_argument('--save-baseline', action='store_true', help=f'write results to {BASELINE_PATH.name}')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.case or CASES:
+        results[name] = run_case(repeat=args.repeat, **CASES[name])
+        m = results[name]
+        print(f"{name:<22} {m['lines']:>9} lines  {m['lines_per_sec']:>10} lines/s  "
+              f"{m['peak_rss_mb']:>7} MB rss  {m['allocs_per_line']:>6} allocs/line  "
+              f"{m['peak_traced_bytes_per_line']:>8} B/line peak")
+
+    if args.save_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print(f"No baseline at {BASELINE_PATH}, run with --save-baseline first")
+            return 1
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
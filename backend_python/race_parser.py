@@ -0,0 +1,566 @@
+import logging
+import re
+from typing import List, Optional, Dict, Any, Tuple, Iterable, Iterator, Type
+
+logger = logging.getLogger(__name__)
+
+# Pre-compiled patterns (compiled once at import instead of on every token)
+DATE_RE = re.compile(r'\d{2}-\d{2}-\d{2}')
+RESULT_LINE_RE = re.compile(r'^\s*\d+')
+RING_TOKEN_RE = re.compile(r'^[A-Z]{2}\s*\d{6,9}')
+TIME_TOKEN_RE = re.compile(r'\d{2}\.\d{4,5}')
+SPEED_TOKEN_RE = re.compile(r'\d+\.\d+')
+HEADER_TOKEN_RE = re.compile(r'\S+')
+
+HEADER_WORDS = ['NR', 'NAAM', 'RING', 'NOM', 'BAGUE', 'VITESSE', 'SNELH']
+
+# Deerlijk column header labels -> (field name, alignment of the values below it).
+# Left aligned values start exactly under their label, right aligned values end
+# (roughly) under it, which is what decides where a column boundary is cut.
+DEERLIJK_COLUMNS = {
+    'NR': ('position', 'right'),
+    'Naam': ('owner_name', 'left'),
+    'Gemeent': ('city', 'left'),
+    'AD': ('basketed', 'right'),
+    'IG': ('entered', 'right'),
+    'Afstand': ('distance', 'right'),
+    'LD': ('country', 'left'),
+    'Ring': ('ring', 'left'),
+    'Bestat': ('time', 'left'),
+    'Snelh.': ('speed', 'right'),
+}
+REQUIRED_COLUMNS = {'position', 'owner_name', 'city', 'distance', 'country', 'ring', 'time', 'speed'}
+
+# Values in the Afstand column below this are "ditto" counters (2nd, 3rd... bird
+# of the same fancier) rather than a distance in meters
+DITTO_DISTANCE_LIMIT = 1000
+
+ColumnLayout = List[Tuple[str, int, Optional[int]]]
+ResultRow = Tuple[int, str, str, str, int, str, float]
+
+# Columns of a columnar race batch, the coefficient is left to the caller
+RESULT_COLUMNS = ['position', 'ring_number', 'owner_name', 'city', 'distance', 'time', 'speed']
+
+
+def build_column_layout(header_line: str) -> Optional[ColumnLayout]:
+    """Read the column boundaries from a Deerlijk header row.
+
+    Returns a list of (field, start, end) slices, or None when the line is not a
+    Deerlijk fixed-width header. Labels we don't know (e.g. JR, which the ring
+    number runs into) are folded into the preceding column.
+    """
+    columns = []
+    for match in HEADER_TOKEN_RE.finditer(header_line):
+        column = DEERLIJK_COLUMNS.get(match.group())
+        if column is None:
+            continue
+        field, align = column
+        # The trailing NR column only repeats the position
+        if field == 'position' and columns:
+            field = 'position_check'
+        columns.append((field, align, match.start(), match.end()))
+
+    if not REQUIRED_COLUMNS.issubset(c[0] for c in columns):
+        return None
+
+    # A left aligned column starts under its label, a right aligned one is cut
+    # halfway through the gap between the previous label and its own
+    starts = [0]
+    for (_, _, _, prev_end), (_, align, start, _) in zip(columns, columns[1:]):
+        starts.append(start if align == 'left' else (prev_end + start + 1) // 2)
+
+    layout = []
+    for idx, (field, _, _, _) in enumerate(columns):
+        end = starts[idx + 1] if idx + 1 < len(starts) else None
+        layout.append((field, starts[idx], end))
+    return layout
+
+
+def parse_race_header(line: str) -> Dict[str, Any]:
+    """Parse a race header line (race name, date, pigeon count, category...)"""
+    parts = line.split()
+    race_name = parts[0] if parts else "Unknown"
+    date = None
+    total_pigeons = 0
+    participants = 0
+    unloading_time = ""
+    category = "Jongen"
+
+    # Parse line to extract race information
+    for part in parts:
+        # Date pattern
+        if DATE_RE.match(part):
+            date = part
+
+        # Total pigeons (number before Jongen/oude)
+        if part.isdigit() and int(part) > 10:  # Reasonable threshold for pigeon count
+            total_pigeons = int(part)
+
+        # Category, files write it as "Jongen", "Oude+jaarse"...
+        lowered = part.lower()
+        if 'jongen' in lowered:
+            category = "Jongen"
+        elif 'oude' in lowered and 'jaar' in lowered:
+            category = "oude & jaar"
+
+        # Participants
+        if 'Deelnemers:' in part:
+            try:
+                participants = int(part.split(':')[1])
+            except (ValueError, IndexError):
+                participants = 0
+
+        # Unloading time
+        if 'LOSTIJD:' in part:
+            try:
+                time_parts = part.split(':')
+                if len(time_parts) >= 3:
+                    unloading_time = f"{time_parts[1]}:{time_parts[2]}"
+                else:
+                    unloading_time = "13:00"
+            except (ValueError, IndexError):
+                unloading_time = "13:00"
+
+    return {
+        'organization': 'De Witpen LUMMEN',
+        'race_name': race_name,
+        'date': date or "2025-01-01",
+        'total_pigeons': total_pigeons,
+        'participants': participants,
+        'unloading_time': unloading_time,
+        'category': category
+    }
+
+
+def calculate_coefficient(position: int, total_pigeons: int) -> float:
+    """Coefficient: (position * 100) / total_pigeons_in_race"""
+    # Note: We limit the max pigeons in race to 5000, not the coefficient itself
+    actual_total_pigeons = min(total_pigeons, 5000) if total_pigeons > 0 else position * 10
+    return (position * 100) / actual_total_pigeons
+
+
+def build_result(current_race: Dict[str, Any], position: int, ring_number: str, owner_name: str,
+                 city: str, distance: int, time: str, speed: float) -> Dict[str, Any]:
+    return {
+        'ring_number': ring_number.replace(' ', ''),
+        'owner_name': owner_name.strip(),
+        'city': city.strip(),
+        'position': position,
+        'distance': distance if distance > 0 else 85000,  # Default distance
+        'time': time or "14:00:00",
+        'speed': speed if speed > 0 else 1000.0,  # Default speed
+        'coefficient': calculate_coefficient(position, current_race['total_pigeons'])
+    }
+
+
+def build_result_columns(rows: List[ResultRow]) -> Dict[str, list]:
+    """Columnar version of build_result: one list per column for all result rows of a race.
+
+    Rows are cleaned and default-filled like build_result, without building a dict
+    per row. There is no coefficient column, the caller computes it once it knows
+    the race's confirmed total.
+    """
+    cleaned = [
+        (position, ring_number.replace(' ', ''), owner_name.strip(), city.strip(),
+         distance if distance > 0 else 85000,  # Default distance
+         time or "14:00:00",
+         speed if speed > 0 else 1000.0)  # Default speed
+        for position, ring_number, owner_name, city, distance, time, speed in rows
+    ]
+    # Only keep rows with essential data
+    cleaned = [row for row in cleaned if row[1] and row[2] and row[0] > 0]
+    if not cleaned:
+        return {column: [] for column in RESULT_COLUMNS}
+    return {column: list(values) for column, values in zip(RESULT_COLUMNS, zip(*cleaned))}
+
+
+def count_results(block: Dict[str, Any]) -> int:
+    """Number of result rows in a race block, list or columnar"""
+    results = block['results']
+    return len(results['position']) if isinstance(results, dict) else len(results)
+
+
+def parse_fixed_width_row(line: str, layout: ColumnLayout,
+                          ditto_distances: Dict[Tuple[str, str], int]) -> Optional[ResultRow]:
+    """Raw (position, ring, owner, city, distance, time, speed) of a Deerlijk result line"""
+    fields = {field: line[start:end].strip() for field, start, end in layout}
+
+    position = int(fields['position'].split()[0])
+    ring_number = f"{fields['country']}{fields['ring']}".replace(' ', '')
+    owner_name = ' '.join(fields['owner_name'].replace('-', ' ').split())
+    city = fields['city']
+
+    if not ring_number or not owner_name:
+        logger.warning(f"Could not extract ring number from line: {line[:100]}")
+        return None
+
+    # The Afstand column only holds the distance on a fancier's first bird,
+    # following birds carry a running count instead
+    distance = int(fields['distance']) if fields['distance'].isdigit() else 0
+    owner_key = (owner_name, city)
+    if distance >= DITTO_DISTANCE_LIMIT:
+        ditto_distances[owner_key] = distance
+    else:
+        distance = ditto_distances.get(owner_key, 0)
+
+    try:
+        speed = float(fields['speed'])
+    except ValueError:
+        speed = 0.0
+
+    return position, ring_number, owner_name, city, distance, fields['time'], speed
+
+
+def parse_token_row(line: str) -> Optional[ResultRow]:
+    """Raw (position, ring, owner, city, distance, time, speed) of a result line of unknown layout"""
+    parts = line.split()
+    if len(parts) < 7:  # Minimum required fields
+        return None
+
+    position = int(parts[0])
+
+    # Extract owner name (typically parts 2-3 or 2-4)
+    owner_name = ""
+    city = ""
+    ring_number = ""
+    distance = 0
+    time = ""
+    speed = 0.0
+
+    # Find ring number pattern (country code + number) and normalize it
+    ring_idx = -1
+    for j, part in enumerate(parts):
+        if RING_TOKEN_RE.match(part) or (len(part) == 2 and part.isupper() and j + 1 < len(parts) and parts[j + 1].isdigit()):
+            ring_idx = j
+            if j + 1 < len(parts) and parts[j + 1].isdigit():
+                ring_number = f"{part}{parts[j + 1]}"  # No space between country and number
+            else:
+                ring_number = part
+            break
+
+    # Clean and normalize ring number
+    ring_number = ring_number.replace(' ', '').strip()
+
+    if not ring_number:
+        logger.warning(f"Could not extract ring number from line: {line[:100]}")
+        return None
+
+    if ring_idx > 1:
+        # Owner name is before ring number
+        owner_name = ' '.join(parts[1:ring_idx]).replace('-', ' ')
+        # City might be right after owner name
+        if ring_idx > 2:
+            city = parts[ring_idx - 1]
+
+    # Extract distance, time, and speed from remaining parts
+    for part in parts[ring_idx + 2:]:  # Skip ring number parts
+        if part.isdigit() and len(part) >= 4:  # Distance (meters)
+            distance = int(part)
+        elif TIME_TOKEN_RE.match(part):  # Time format
+            time = part
+        elif SPEED_TOKEN_RE.match(part):  # Speed (decimal)
+            try:
+                speed_val = float(part)
+                if speed_val > 100:  # Reasonable speed threshold
+                    speed = speed_val
+            except ValueError:
+                pass
+
+    if not owner_name:  # Only add if we have essential data
+        return None
+
+    return position, ring_number, owner_name, city, distance, time, speed
+
+
+def is_organization_header(line: str) -> bool:
+    """Organization headers start a new, independent section of a result file"""
+    return 'Data Technology Deerlijk' in line or ('LUMMEN' in line and 'Data Technology' in line)
+
+
+# Sniffers only look at this much of the start of a file
+SNIFF_SIZE = 8 * 1024
+
+# Format parsers by name, tried in registration order by detect_format
+PARSER_REGISTRY: Dict[str, Type['RaceFileParser']] = {}
+
+
+def register_parser(cls: Type['RaceFileParser']) -> Type['RaceFileParser']:
+    """Class decorator adding a format parser to the registry"""
+    PARSER_REGISTRY[cls.name] = cls
+    return cls
+
+
+class RaceFileParser:
+    """Incremental race file parser, also the fallback for unknown layouts.
+
+    Lines are fed one at a time and a parsed race block ({'race', 'results'}) is
+    returned as soon as it is complete, so callers never need more than one race
+    in memory. Every line is checked against all known markers and result lines
+    of unknown layout are parsed token by token.
+
+    Format specific parsers subclass this, implement sniff() and are added with
+    @register_parser.
+
+    With columnar=True each block's 'results' is a dict of per-column lists (see
+    build_result_columns) instead of a list of per-row dicts. With after_position
+    the result lines of the first race before that position are skipped without
+    being parsed, used to ingest only the rows a republished race added. Rows at
+    after_position itself are parsed again, a tie there may have been cut off.
+    """
+
+    name = 'generic'
+
+    def __init__(self, columnar: bool = False, after_position: int = 0):
+        self.columnar = columnar
+        self.after_position = after_position
+        self.race_started = False
+        self.skipped_rows = 0
+        self.current_race = None
+        self.current_results = []
+        self.layout = None
+        self.ditto_distances = {}
+
+    @classmethod
+    def sniff(cls, sample: str) -> bool:
+        """Whether the start of a file (up to SNIFF_SIZE characters) is in this format"""
+        return True
+
+    @classmethod
+    def is_section_start(cls, line: str) -> bool:
+        """Lines where the parser resets, files may be split there and parsed in parallel"""
+        return is_organization_header(line)
+
+    @classmethod
+    def is_race_header(cls, line: str) -> bool:
+        """Race header (contains race name, date, pigeons count)"""
+        return bool(DATE_RE.search(line)) and ('Jongen' in line or 'oude' in line or 'jaar' in line)
+
+    def _finish_race(self) -> Optional[Dict[str, Any]]:
+        block = None
+        # A race whose rows were all ingested before is still reported, with no results
+        if self.current_race and (self.current_results or self.skipped_rows):
+            results = self.current_results
+            if self.columnar:
+                results = build_result_columns(results)
+            block = {
+                'race': self.current_race,
+                'results': results,
+                'skipped_rows': self.skipped_rows
+            }
+        self.current_race = None
+        self.current_results = []
+        self.skipped_rows = 0
+        return block
+
+    def _start_race(self, line: str):
+        # after_position only applies to the first race
+        if self.race_started:
+            self.after_position = 0
+        self.race_started = True
+        self.current_race = parse_race_header(line)
+
+    def _already_ingested(self, line: str) -> bool:
+        if self.after_position and int(RESULT_LINE_RE.match(line).group()) < self.after_position:
+            self.skipped_rows += 1
+            return True
+        return False
+
+    def _start_section(self) -> Optional[Dict[str, Any]]:
+        # Close the previous race if exists
+        self.layout = None
+        self.ditto_distances = {}
+        return self._finish_race()
+
+    def _add_row(self, row: Optional[ResultRow]):
+        if row:
+            # Columnar mode keeps the raw tuples until the race is complete
+            self.current_results.append(row if self.columnar else build_result(self.current_race, *row))
+
+    def _parse_fixed_width(self, raw_line: str):
+        if self._already_ingested(raw_line):
+            return
+        try:
+            self._add_row(parse_fixed_width_row(raw_line, self.layout, self.ditto_distances))
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Error parsing line: {raw_line.strip()[:50]}... - {str(e)}")
+
+    def _parse_tokens(self, line: str):
+        if self._already_ingested(line):
+            return
+        try:
+            self._add_row(parse_token_row(line))
+        except (ValueError, IndexError) as e:
+            # Log parsing errors but continue
+            logger.warning(f"Error parsing line: {line[:50]}... - {str(e)}")
+
+    def feed_line(self, raw_line: str) -> Optional[Dict[str, Any]]:
+        """Parse one line, returning the previous race block when this line closes it"""
+        raw_line = raw_line.rstrip('\r\n')
+        line = raw_line.strip()
+
+        # Skip empty lines and separator lines
+        if not line or line.startswith('------') or line.startswith('==='):
+            return None
+
+        # Fixed-width result lines, checked first so names like "KURINGE"
+        # or "HENRY" are not mistaken for column headers
+        if self.layout and self.current_race and RESULT_LINE_RE.match(line):
+            self._parse_fixed_width(raw_line)
+            return None
+
+        # Check for organization header (more specific to avoid matching city names)
+        if is_organization_header(line):
+            return self._start_section()
+
+        # Check for race header (contains race name, date, pigeons count)
+        if self.is_race_header(line):
+            self._start_race(line)
+            return None
+
+        # Column headers: the Deerlijk one defines the fixed-width layout
+        if any(header in line.upper() for header in HEADER_WORDS):
+            self.layout = build_column_layout(raw_line) or self.layout
+            return None
+
+        # Parse race result lines (starts with a number)
+        if self.current_race and RESULT_LINE_RE.match(line):
+            self._parse_tokens(line)
+        return None
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Return the last race block once the input is exhausted"""
+        return self._finish_race()
+
+
+@register_parser
+class DeerlijkParser(RaceFileParser):
+    """Data Technology Deerlijk exports.
+
+    The layout is known up front, so each line only goes through the checks that
+    can apply at its place in a section: result lines are sliced at the column
+    offsets of the "NR Naam Gemeent ..." header, and the header-word heuristics
+    of the generic parser are never run.
+    """
+
+    name = 'deerlijk'
+
+    @classmethod
+    def sniff(cls, sample: str) -> bool:
+        if 'Data Technology Deerlijk' not in sample:
+            return False
+        return any(build_column_layout(line) for line in sample.split('\n') if 'Naam' in line)
+
+    def feed_line(self, raw_line: str) -> Optional[Dict[str, Any]]:
+        raw_line = raw_line.rstrip('\r\n')
+
+        if RESULT_LINE_RE.match(raw_line):
+            if self.current_race:
+                if self.layout:
+                    self._parse_fixed_width(raw_line)
+                else:
+                    # Section without a recognised column header
+                    self._parse_tokens(raw_line.strip())
+            return None
+
+        line = raw_line.strip()
+        if not line or line[0] in '-=':
+            return None
+
+        if is_organization_header(line):
+            return self._start_section()
+
+        if line.startswith('NR'):
+            self.layout = build_column_layout(raw_line) or self.layout
+            return None
+
+        if self.is_race_header(line):
+            self._start_race(line)
+        return None
+
+
+def get_parser(name: str) -> Type[RaceFileParser]:
+    """Parser class for a format name, the generic parser for unknown names"""
+    return PARSER_REGISTRY.get(name, RaceFileParser)
+
+
+def detect_format(sample: str) -> Type[RaceFileParser]:
+    """Pick the parser for a file from its first SNIFF_SIZE characters"""
+    sample = sample[:SNIFF_SIZE]
+    for parser_cls in PARSER_REGISTRY.values():
+        if parser_cls.sniff(sample):
+            return parser_cls
+    return RaceFileParser
+
+
+def iter_race_blocks(lines: Iterable[str], parser_cls: Type[RaceFileParser] = RaceFileParser,
+                     columnar: bool = False, after_position: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield parsed race blocks from an iterable of lines, one race at a time"""
+    parser = parser_cls(columnar=columnar, after_position=after_position)
+    for line in lines:
+        block = parser.feed_line(line)
+        if block:
+            yield block
+    block = parser.close()
+    if block:
+        yield block
+
+
+def parse_race_file(content: str, columnar: bool = False) -> Dict[str, Any]:
+    """Parse the race results TXT file, picking the parser from the start of the file"""
+    parser_cls = detect_format(content[:SNIFF_SIZE])
+    return {'races': list(iter_race_blocks(content.strip().split('\n'), parser_cls, columnar))}
+
+
+class SectionSplitter:
+    """Incremental section splitter, lines are fed one at a time like RaceFileParser.
+
+    A section is returned by the line starting the next one, the last section by close().
+    """
+
+    def __init__(self, parser_cls: Type[RaceFileParser] = RaceFileParser):
+        self.parser_cls = parser_cls
+        self.section = []
+
+    def feed_line(self, line: str) -> Optional[List[str]]:
+        section = None
+        if self.section and self.parser_cls.is_section_start(line):
+            section, self.section = self.section, []
+        self.section.append(line)
+        return section
+
+    def close(self) -> Optional[List[str]]:
+        section, self.section = self.section, []
+        return section or None
+
+
+def iter_sections(lines: Iterable[str], parser_cls: Type[RaceFileParser] = RaceFileParser) -> Iterator[List[str]]:
+    """Split lines at section starts (organization headers).
+
+    The parser resets all of its state there, so each section can be parsed on
+    its own (e.g. in another process) and the blocks concatenated in file order
+    give the same result as parsing the whole file.
+    """
+    splitter = SectionSplitter(parser_cls)
+    for line in lines:
+        section = splitter.feed_line(line)
+        if section:
+            yield section
+    section = splitter.close()
+    if section:
+        yield section
+
+
+def parse_section(lines: List[str], parser_name: str = RaceFileParser.name,
+                  columnar: bool = False, after_position: int = 0) -> List[Dict[str, Any]]:
+    """Parse one section into its race blocks with the named format parser"""
+    return list(iter_race_blocks(lines, get_parser(parser_name), columnar, after_position))
+
+
+def peek_race(lines: Iterable[str], parser_cls: Type[RaceFileParser] = RaceFileParser) -> Optional[Dict[str, Any]]:
+    """Header of the first race in a section, without parsing any result lines"""
+    for line in lines:
+        if parser_cls.is_race_header(line):
+            return parse_race_header(line.strip())
+        if RESULT_LINE_RE.match(line):
+            break
+    return None
@@ -1,17 +1,39 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, ReplaceOne, DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Tuple, Union
 import uuid
 from datetime import datetime, timezone
-import re
 import io
+import json
+import base64
+import binascii
+import codecs
+import hashlib
+import tempfile
+import asyncio
+import multiprocessing
+import time
+import threading
+import gzip
+import zipfile
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from race_parser import (
+    RESULT_COLUMNS, SNIFF_SIZE, SectionSplitter, count_results, detect_format, parse_section, peek_race
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,6 +43,50 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+DUPLICATE_KEY_ERROR = 11000
+
+# Uploads are read and parsed in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))
+
+# Result file sections are parsed in this many worker processes (0 uses a thread instead)
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))
+parse_executor = None
+
+# Background upload jobs: queued uploads beyond this are refused, uploads up to
+# UPLOAD_SPOOL_MEMORY bytes are kept in memory while queued, bigger ones on disk
+UPLOAD_QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 100))
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', 1))
+UPLOAD_SPOOL_MEMORY = int(os.environ.get('UPLOAD_SPOOL_MEMORY', 1024 * 1024))
+upload_queue = None
+upload_workers = []
+
+# Parsed preview uploads wait this long for confirmation, at most PREVIEW_CACHE_SIZE at once
+# holding at most PREVIEW_CACHE_ROWS parsed rows together. Files of more than
+# MAX_PREVIEW_ROWS rows can't be previewed, they're uploaded with total_pigeons_override
+PREVIEW_TTL_SECONDS = int(os.environ.get('PREVIEW_TTL_SECONDS', 15 * 60))
+PREVIEW_CACHE_SIZE = int(os.environ.get('PREVIEW_CACHE_SIZE', 32))
+PREVIEW_CACHE_ROWS = int(os.environ.get('PREVIEW_CACHE_ROWS', 200000))
+MAX_PREVIEW_ROWS = int(os.environ.get('MAX_PREVIEW_ROWS', 50000))
+
+# With LOG_LEVEL=DEBUG every ROW_LOG_SAMPLE_RATE-th parsed result is logged
+ROW_LOG_SAMPLE_RATE = max(int(os.environ.get('ROW_LOG_SAMPLE_RATE', 100)), 1)
+
+# Most documents a list endpoint returns per page
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+# Pigeons per POST /api/pigeon-stats/batch request
+MAX_STATS_BATCH = int(os.environ.get('MAX_STATS_BATCH', 1000))
+
+# Responses of the polled GET endpoints kept in memory, least recently used go first
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+
+# Files of a batch upload are ingested this many at a time
+BATCH_UPLOAD_CONCURRENCY = int(os.environ.get('BATCH_UPLOAD_CONCURRENCY', 4))
+
+# Largest result file a batch upload may unpack to, and the most all its files may unpack to
+MAX_UNPACKED_FILE_SIZE = int(os.environ.get('MAX_UNPACKED_FILE_SIZE', 64 * 1024 * 1024))
+MAX_UNPACKED_BATCH_SIZE = int(os.environ.get('MAX_UNPACKED_BATCH_SIZE', 256 * 1024 * 1024))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -61,6 +127,7 @@ class Race(BaseModel):
     participants: int
     unloading_time: str
     category: str  # "Jongen" or "oude & jaar"
+    last_position: int = 0  # Highest result position ingested, republished files are parsed again from it
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class RaceResult(BaseModel):
@@ -91,6 +158,11 @@ class RaceResultWithDetails(BaseModel):
     pigeon: Optional[Pigeon] = None
     race: Optional[Race] = None
 
+class NormalizedRaceResults(BaseModel):
+    results: List[RaceResult]
+    races: Dict[str, Race]  # by race id
+    pigeons: Dict[str, Pigeon]  # by pigeon id
+
 class Pairing(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     sire_id: str  # Father pigeon ID
@@ -161,6 +233,28 @@ class LoftLog(BaseModel):
     reminder_date: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UploadedFile(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    content_hash: str  # sha256 of the uploaded bytes
+    filename: str
+    total_pigeons_override: Optional[int] = None
+    race_ids: List[str] = []
+    outcome: Dict[str, Any]  # Response returned for this upload
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class UploadJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    total_pigeons_override: Optional[int] = None
+    status: str = "queued"  # queued, running, completed, failed
+    races_parsed: int = 0
+    rows_persisted: int = 0
+    rows_skipped: int = 0  # Already ingested, duplicate or unregistered
+    summary: Optional[Dict[str, Any]] = None  # Upload outcome once completed
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
+
 class PigeonStats(BaseModel):
     total_races: int
     total_wins: int
@@ -169,186 +263,122 @@ class PigeonStats(BaseModel):
     avg_placement: float
     total_distance: int
 
-# Helper functions
-def parse_race_file(content: str) -> Dict[str, Any]:
-    """Parse the race results TXT file"""
-    lines = content.strip().split('\n')
-    races = []
-    current_race = None
-    current_results = []
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Skip empty lines and separator lines
-        if not line or line.startswith('------') or line.startswith('==='):
-            i += 1
-            continue
-            
-        # Check for organization header (more specific to avoid matching city names)
-        if 'Data Technology Deerlijk' in line or ('LUMMEN' in line and 'Data Technology' in line):
-            # Save previous race if exists
-            if current_race and current_results:
-                races.append({
-                    'race': current_race,
-                    'results': current_results
-                })
-            
-            current_race = None
-            current_results = []
-            i += 1
-            continue
-            
-        # Check for race header (contains race name, date, pigeons count)
-        if re.search(r'\d{2}-\d{2}-\d{2}', line) and ('Jongen' in line or 'oude' in line or 'jaar' in line):
-            parts = line.split()
-            race_name = parts[0] if parts else "Unknown"
-            date = None
-            total_pigeons = 0
-            participants = 0
-            unloading_time = ""
-            category = "Jongen"
-            
-            # Parse line to extract race information
-            for j, part in enumerate(parts):
-                # Date pattern
-                if re.match(r'\d{2}-\d{2}-\d{2}', part):
-                    date = part
-                
-                # Total pigeons (number before Jongen/oude)
-                if part.isdigit() and int(part) > 10:  # Reasonable threshold for pigeon count
-                    total_pigeons = int(part)
-                
-                # Category
-                if 'Jongen' in part:
-                    category = "Jongen"
-                elif 'oude' in part and 'jaar' in part:
-                    category = "oude & jaar"
-                
-                # Participants
-                if 'Deelnemers:' in part:
-                    try:
-                        participants = int(part.split(':')[1])
-                    except (ValueError, IndexError):
-                        participants = 0
-                
-                # Unloading time
-                if 'LOSTIJD:' in part:
-                    try:
-                        time_parts = part.split(':')
-                        if len(time_parts) >= 3:
-                            unloading_time = f"{time_parts[1]}:{time_parts[2]}"
-                        else:
-                            unloading_time = "13:00"
-                    except (ValueError, IndexError):
-                        unloading_time = "13:00"
-            
-            current_race = {
-                'organization': 'De Witpen LUMMEN',
-                'race_name': race_name,
-                'date': date or "2025-01-01",
-                'total_pigeons': total_pigeons,
-                'participants': participants,
-                'unloading_time': unloading_time,
-                'category': category
-            }
-            i += 1
-            continue
-            
-        # Skip column headers
-        if any(header in line.upper() for header in ['NR', 'NAAM', 'RING', 'NOM', 'BAGUE', 'VITESSE', 'SNELH']):
-            i += 1
-            continue
-            
-        # Parse race result lines (starts with a number)
-        if line and current_race and re.match(r'^\s*\d+', line):
-            parts = line.split()
-            if len(parts) >= 7:  # Minimum required fields
-                try:
-                    position = int(parts[0])
-                    
-                    # Extract owner name (typically parts 2-3 or 2-4)
-                    owner_name = ""
-                    city = ""
-                    ring_number = ""
-                    distance = 0
-                    time = ""
-                    speed = 0.0
-                    
-                    # Find ring number pattern (country code + number) and normalize it
-                    ring_idx = -1
-                    for j, part in enumerate(parts):
-                        if re.match(r'^[A-Z]{2}\s*\d{6,9}', part) or (len(part) == 2 and part.isupper() and j + 1 < len(parts) and parts[j + 1].isdigit()):
-                            ring_idx = j
-                            if j + 1 < len(parts) and parts[j + 1].isdigit():
-                                ring_number = f"{part}{parts[j + 1]}"  # No space between country and number
-                            else:
-                                ring_number = part
-                            break
-                    
-                    # Clean and normalize ring number
-                    ring_number = ring_number.replace(' ', '').strip()
-                    
-                    if not ring_number:
-                        logger.warning(f"Could not extract ring number from line: {line[:100]}")
-                        continue
-                    
-                    if ring_idx > 1:
-                        # Owner name is before ring number
-                        owner_name = ' '.join(parts[1:ring_idx]).replace('-', ' ')
-                        # City might be right after owner name
-                        if ring_idx > 2:
-                            city = parts[ring_idx - 1]
-                    
-                    # Extract distance, time, and speed from remaining parts
-                    for part in parts[ring_idx + 2:]:  # Skip ring number parts
-                        if part.isdigit() and len(part) >= 4:  # Distance (meters)
-                            distance = int(part)
-                        elif re.match(r'\d{2}\.\d{4,5}', part):  # Time format
-                            time = part
-                        elif re.match(r'\d+\.\d+', part):  # Speed (decimal)
-                            try:
-                                speed_val = float(part)
-                                if speed_val > 100:  # Reasonable speed threshold
-                                    speed = speed_val
-                            except ValueError:
-                                pass
-                    
-                    # Calculate coefficient: (position * 100) / total_pigeons_in_race
-                    # Note: We limit the max pigeons in race to 5000, not the coefficient itself
-                    actual_total_pigeons = min(current_race['total_pigeons'], 5000) if current_race['total_pigeons'] > 0 else position * 10
-                    coefficient = (position * 100) / actual_total_pigeons
-                    
-                    if ring_number and owner_name:  # Only add if we have essential data
-                        result = {
-                            'ring_number': ring_number.replace(' ', ''),
-                            'owner_name': owner_name.strip(),
-                            'city': city.strip(),
-                            'position': position,
-                            'distance': distance if distance > 0 else 85000,  # Default distance
-                            'time': time or "14:00:00",
-                            'speed': speed if speed > 0 else 1000.0,  # Default speed
-                            'coefficient': coefficient
-                        }
-                        current_results.append(result)
-                        
-                except (ValueError, IndexError) as e:
-                    # Log parsing errors but continue
-                    logger.warning(f"Error parsing line: {line[:50]}... - {str(e)}")
-                    pass
-        
-        i += 1
-    
-    # Add the last race
-    if current_race and current_results:
-        races.append({
-            'race': current_race,
-            'results': current_results
-        })
-    
-    return {'races': races}
+class PigeonStatsBatchRequest(BaseModel):
+    ring_numbers: List[str] = []
+    pigeon_ids: List[str] = []
+
+class PigeonStatsBatch(BaseModel):
+    ring_numbers: Dict[str, PigeonStats]  # by requested ring number
+    pigeon_ids: Dict[str, PigeonStats]  # by requested pigeon id
+
+class ExpiringCache:
+    """Bounded in-process store whose entries expire after a fixed time.
+
+    All entries live equally long, so insertion order is expiry order and the
+    oldest entry is evicted first when the cache is full, by entry count or by
+    the total of the sizes the entries were stored with. Entries only exist in
+    the server process that stored them.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_size: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def _evict_oldest(self):
+        _, (_, _, size) = self.entries.popitem(last=False)
+        self.size -= size
+
+    def _expire(self):
+        now = time.monotonic()
+        while self.entries and next(iter(self.entries.values()))[0] <= now:
+            self._evict_oldest()
+
+    def put(self, value: Any, size: int = 0) -> str:
+        """Store a value, returns the token to fetch it with"""
+        self._expire()
+        token = str(uuid.uuid4())
+        self.entries[token] = (time.monotonic() + self.ttl_seconds, value, size)
+        self.size += size
+        while len(self.entries) > self.max_entries or (self.max_size is not None and self.size > self.max_size):
+            self._evict_oldest()
+        return token
+
+    def pop(self, token: str) -> Any:
+        """Remove and return a value, None when unknown or expired"""
+        self._expire()
+        entry = self.entries.pop(token, None)
+        if not entry:
+            return None
+        self.size -= entry[2]
+        return entry[1]
+
+# Sized by parsed rows
+parsed_uploads = ExpiringCache(PREVIEW_CACHE_SIZE, PREVIEW_TTL_SECONDS, PREVIEW_CACHE_ROWS)
 
+class ResponseCache:
+    """Bounded in-process LRU store of serialised responses.
+
+    Keys carry the versions of the collections a response was built from, so
+    bumping a collection's version makes its cached responses unreachable; they
+    are evicted as the cache fills up. Versions only count the writes of this
+    server process.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+collection_versions = defaultdict(int)
+
+# Cached GET endpoints and the collections their responses are built from
+CACHED_ENDPOINTS = {
+    "/api/dashboard-stats": ("pigeons", "races", "race_results"),
+    "/api/pigeons": ("pigeons",),
+    "/api/pairings": ("pairings",),
+    "/api/race-results": ("race_results", "pigeons", "races"),
+}
+
+# GET endpoints whose ETag comes from collection versions, so a matching
+# If-None-Match is answered before the endpoint runs. Other GETs hash the body.
+VERSIONED_ENDPOINTS = {
+    **CACHED_ENDPOINTS,
+    "/api/health-logs": ("health_logs",),
+    "/api/loft-logs": ("loft_logs",),
+}
+
+# Versions restart at 0 with the process, ETags include this so they don't repeat
+VERSION_EPOCH = uuid.uuid4().hex
+
+def endpoint_versions(request: Request, collections: Tuple[str, ...]) -> Tuple:
+    """Path, query and collection versions a versioned GET response is built from"""
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())),
+            tuple(collection_versions[collection] for collection in collections))
+
+def make_etag(data: bytes) -> str:
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+def bump_versions(*collections: str):
+    """Mark collections as written, responses cached from them are no longer served"""
+    for collection in collections:
+        collection_versions[collection] += 1
+
+# Helper functions
 def prepare_for_mongo(data):
     """Prepare data for MongoDB storage"""
     if isinstance(data, dict):
@@ -368,6 +398,132 @@ def parse_from_mongo(item):
                     pass
     return item
 
+# Keyset pagination shared by the list endpoints. A page is sorted on a fixed set
+# of indexed fields ending in the unique id, the opaque cursor holds the values of
+# those fields in the last document of the page and the next page starts after it
+NEWEST_FIRST = (("created_at", -1), ("id", -1))
+OLDEST_FIRST = (("created_at", 1), ("id", 1))
+LOGS_ORDER = (("date", -1), ("id", -1))
+
+def without_object_id(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a stored document without Mongo's _id, to store it in another collection"""
+    return {k: v for k, v in doc.items() if k != '_id'}
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def cursor_query(cursor: Optional[str], sort: Tuple[Tuple[str, int], ...] = NEWEST_FIRST) -> Dict[str, Any]:
+    """Query for the documents after a cursor in the given sort order"""
+    if not cursor:
+        return {}
+    values = decode_cursor(cursor, len(sort))
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: value for (prev_field, _), value in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def set_next_cursor(response: Response, docs: List[Dict[str, Any]], limit: int,
+                    sort: Tuple[Tuple[str, int], ...] = NEWEST_FIRST):
+    """A full page tells the client where the next one starts, in the X-Next-Cursor header"""
+    if docs and len(docs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([docs[-1].get(field) for field, _ in sort])
+
+async def find_page(collection, query: Dict[str, Any], response: Response, limit: int,
+                    cursor: Optional[str] = None, sort: Tuple[Tuple[str, int], ...] = NEWEST_FIRST,
+                    projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """One page of a collection's documents matching query"""
+    limit = page_size(limit)
+    after_cursor = cursor_query(cursor, sort)
+    if after_cursor:
+        query = {"$and": [query, after_cursor]} if query else after_cursor
+    docs = await collection.find(query, projection).sort(list(sort)).limit(limit).to_list(limit)
+    set_next_cursor(response, docs, limit, sort)
+    return docs
+
+# Pigeon search: every pigeon stores the 1-, 2- and 3-letter grams of its searchable
+# fields in search_grams (multikey indexed), a search matches the pigeons holding
+# all grams of the search text, then Mongo checks, ranks and pages them. Short
+# searches match most pigeons, at most MAX_SEARCH_CANDIDATES of them are ranked
+PIGEON_SEARCH_FIELDS = ("ring_number", "name", "breeder", "color", "loft")
+MAX_SEARCH_CANDIDATES = int(os.environ.get('MAX_SEARCH_CANDIDATES', 5000))
+# Field values are far shorter than this, so a match position never spills into the field rank
+SEARCH_RANK_STEP = 100000
+
+def text_grams(text: str, sizes: Tuple[int, ...] = (1, 2, 3)) -> set:
+    text = text.lower()
+    return {text[i:i + size] for size in sizes for i in range(len(text) - size + 1)}
+
+def pigeon_search_grams(pigeon: Dict[str, Any]) -> List[str]:
+    grams = set()
+    for field in PIGEON_SEARCH_FIELDS:
+        if pigeon.get(field):
+            grams |= text_grams(pigeon[field])
+    return sorted(grams)
+
+def pigeon_search_rank(search: str) -> Dict[str, Any]:
+    """Mongo expression ranking a pigeon for a lowercased search text, null when it doesn't match.
+
+    Lower ranks are better: exact matches first, then prefixes, then other substrings;
+    ring and name before the rest; then the earlier match. The three are packed into one
+    number per field and the pigeon gets the best of its fields.
+    """
+    ranks = []
+    for field_rank, field in enumerate(PIGEON_SEARCH_FIELDS):
+        match_rank = {"$cond": [{"$eq": ["$$value", search]}, 0, {"$cond": [{"$eq": ["$$position", 0]}, 1, 2]}]}
+        ranks.append({"$let": {
+            "vars": {"value": {"$toLower": {"$ifNull": [f"${field}", ""]}}},
+            "in": {"$let": {
+                "vars": {"position": {"$indexOfCP": ["$$value", search]}},
+                "in": {"$cond": [
+                    {"$lt": ["$$position", 0]},
+                    None,
+                    {"$add": [
+                        {"$multiply": [match_rank, len(PIGEON_SEARCH_FIELDS) * SEARCH_RANK_STEP]},
+                        field_rank * SEARCH_RANK_STEP,
+                        "$$position"
+                    ]}
+                ]}
+            }}
+        }})
+    return {"$min": ranks}
+
+def race_lookup_query(race_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields identifying a race across uploads"""
+    return {
+        "race_name": race_info['race_name'],
+        "date": race_info['date'],
+        "organization": race_info['organization'],
+        "category": race_info['category']
+    }
+
+async def invalidate_uploaded_files(race_id: Optional[str] = None):
+    """Forget what earlier uploads ingested once a re-upload would give a different outcome.
+
+    Drops the recorded uploads and resets the races' last ingested position, so the
+    next upload parses every row again. Only needed when stored results are deleted
+    (a race, one of its results, or the test data); pigeon changes don't need it since
+    results for unregistered rings are kept in unclaimed_results.
+    """
+    query = {"race_ids": race_id} if race_id else {}
+    await db.uploaded_files.delete_many(query)
+    race_query = {"id": race_id} if race_id else {"last_position": {"$gt": 0}}
+    await db.races.update_many(race_query, {"$set": {"last_position": 0}})
+    bump_versions("races")
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -383,25 +539,48 @@ async def create_pigeon(pigeon: PigeonCreate):
     pigeon_dict = pigeon.dict()
     pigeon_obj = Pigeon(**pigeon_dict)
     pigeon_data = prepare_for_mongo(pigeon_obj.dict())
+    pigeon_data['search_grams'] = pigeon_search_grams(pigeon_data)
     await db.pigeons.insert_one(pigeon_data)
+    bump_versions("pigeons")
+    await claim_unclaimed_results(pigeon_obj.id, pigeon_obj.ring_number)
     return pigeon_obj
 
 @api_router.get("/pigeons", response_model=List[Pigeon])
-async def get_pigeons(search: Optional[str] = None):
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"ring_number": {"$regex": search, "$options": "i"}},
-                {"breeder": {"$regex": search, "$options": "i"}},
-                {"color": {"$regex": search, "$options": "i"}},
-                {"loft": {"$regex": search, "$options": "i"}}
-            ]
-        }
+async def get_pigeons(response: Response, search: Optional[str] = None, limit: int = MAX_PAGE_SIZE,
+                      cursor: Optional[str] = None):
+    """Pigeons oldest first, or with search the pigeons matching it in any search field.
+
+    Search results are ranked best match first. Both are paged, a full page sets
+    the X-Next-Cursor header, pass it as cursor to get the next page.
+    """
+    search = (search or '').strip().lower()
+    if not search:
+        pigeons = await find_page(db.pigeons, {}, response, limit, cursor, OLDEST_FIRST, {"search_grams": 0})
+        return [Pigeon(**parse_from_mongo(pigeon)) for pigeon in pigeons]
+    
+    gram_size = min(len(search), 3)
+    query = {"search_grams": {"$all": sorted(text_grams(search, (gram_size,)))}}
     
-    pigeons = await db.pigeons.find(query).to_list(1000)
-    return [Pigeon(**parse_from_mongo(pigeon)) for pigeon in pigeons]
+    # Ranked results have no stable sort key to resume from, their cursor holds the offset
+    limit = page_size(limit)
+    offset = decode_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The grams narrow the candidates down, the substring check in the rank is exact
+    pipeline = [
+        {"$match": query},
+        {"$limit": MAX_SEARCH_CANDIDATES},
+        {"$addFields": {"search_rank": pigeon_search_rank(search)}},
+        {"$match": {"search_rank": {"$ne": None}}},
+        {"$sort": {"search_rank": 1, "ring_number": 1}},
+        {"$skip": offset},
+        {"$limit": limit},
+        {"$project": {"search_grams": 0, "search_rank": 0}}
+    ]
+    page = await db.pigeons.aggregate(pipeline).to_list(limit)
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([offset + limit])
+    return [Pigeon(**parse_from_mongo(pigeon)) for pigeon in page]
 
 @api_router.get("/pigeons/{pigeon_id}", response_model=Pigeon)
 async def get_pigeon(pigeon_id: str):
@@ -425,7 +604,11 @@ async def update_pigeon(pigeon_id: str, pigeon_update: PigeonCreate):
         raise HTTPException(status_code=400, detail="Ring number already exists for another pigeon")
     
     update_data = prepare_for_mongo(pigeon_update.dict())
+    update_data['search_grams'] = pigeon_search_grams(update_data)
     await db.pigeons.update_one({"id": pigeon_id}, {"$set": update_data})
+    bump_versions("pigeons")
+    if pigeon_update.ring_number != existing['ring_number']:
+        await claim_unclaimed_results(pigeon_id, pigeon_update.ring_number)
     updated_pigeon = await db.pigeons.find_one({"id": pigeon_id})
     return Pigeon(**parse_from_mongo(updated_pigeon))
 
@@ -436,16 +619,26 @@ async def delete_pigeon(pigeon_id: str):
     if not pigeon:
         raise HTTPException(status_code=404, detail="Pigeon not found")
     
-    # Delete all race results associated with this pigeon (cascade deletion)
-    race_results_deleted = await db.race_results.delete_many({
+    # Delete all race results associated with this pigeon (cascade deletion), they
+    # go back to the unclaimed results in case the pigeon is registered again
+    pigeon_results_query = {
         "$or": [
             {"pigeon_id": pigeon_id},  # Delete by pigeon_id
             {"ring_number": pigeon["ring_number"]}  # Delete by ring number (for safety)
         ]
-    })
+    }
+    pigeon_results = await db.race_results.find(pigeon_results_query).to_list(None)
+    if pigeon_results:
+        await insert_new_results(
+            db.unclaimed_results,
+            [{**without_object_id(doc), "pigeon_id": None} for doc in pigeon_results]
+        )
+    race_results_deleted = await db.race_results.delete_many(pigeon_results_query)
+    await rebuild_pigeon_stats([pigeon["ring_number"]] + [doc['ring_number'] for doc in pigeon_results])
     
     # Delete the pigeon
     result = await db.pigeons.delete_one({"id": pigeon_id})
+    bump_versions("pigeons", "race_results")
     
     return {
         "message": "Pigeon and associated race results deleted successfully",
@@ -455,220 +648,907 @@ async def delete_pigeon(pigeon_id: str):
 class RaceUploadRequest(BaseModel):
     total_pigeons_override: Optional[int] = None
 
-@api_router.post("/upload-race-results")
-async def upload_race_results(file: UploadFile = File(...), total_pigeons_override: Optional[int] = None):
-    if not file.filename.endswith('.txt'):
-        raise HTTPException(status_code=400, detail="Only TXT files are allowed")
+async def iter_upload_lines(file: UploadFile):
+    """Yield decoded lines from an uploaded file, reading it in chunks"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()  # Last piece may be an incomplete line
+        for line in lines:
+            yield line
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def get_parse_executor() -> Optional[ProcessPoolExecutor]:
+    """Lazily start the process pool used to parse result files"""
+    global parse_executor
+    if parse_executor is None and PARSE_WORKERS > 0:
+        # spawn rather than fork: the server process runs Motor's background threads
+        parse_executor = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return parse_executor
+
+def discard_parse_executor(executor: ProcessPoolExecutor):
+    """Drop a broken process pool, the next upload starts a new one"""
+    global parse_executor
+    executor.shutdown(wait=False, cancel_futures=True)
+    # A concurrent upload may have replaced it already
+    if parse_executor is executor:
+        parse_executor = None
+
+async def stream_race_blocks(file: UploadFile):
+    """Parse an uploaded file as it is read, yielding one race block at a time.
+
+    The format is detected once from the start of the file. The file is then
+    split at section starts (organization headers) and the sections are parsed
+    in the process pool, off the event loop. Blocks are yielded in file order
+    and at most PARSE_WORKERS * 2 sections are in flight at once.
+    
+    When a worker dies (e.g. killed for running out of memory) the pool is
+    broken: this upload fails and the pool is replaced for the next ones.
+    """
+    sample = await file.read(SNIFF_SIZE)
+    await file.seek(0)
+    parser_cls = detect_format(sample.decode('utf-8', errors='ignore'))
+    logger.info(f"Detected {parser_cls.name} format for {file.filename}")
+    
+    loop = asyncio.get_running_loop()
+    executor = get_parse_executor()
+    max_in_flight = max(PARSE_WORKERS, 1) * 2
+    pending = deque()
+    splitter = SectionSplitter(parser_cls)
+    
+    seen_races = set()
+    
+    async def submit(section):
+        # Rows of a race we already have are only parsed beyond its last ingested position.
+        # Not for a race seen earlier in this file, its position may not be stored yet
+        after_position = 0
+        race_info = peek_race(section, parser_cls)
+        if race_info:
+            race_query = race_lookup_query(race_info)
+            race_key = tuple(race_query.values())
+            if race_key not in seen_races:
+                seen_races.add(race_key)
+                known_race = await db.races.find_one(race_query, {"last_position": 1})
+                after_position = known_race.get('last_position', 0) if known_race else 0
+        return loop.run_in_executor(executor, parse_section, section, parser_cls.name, True, after_position)
     
     try:
-        content = await file.read()
-        content_str = content.decode('utf-8')
-        logger.info(f"Processing file with content length: {len(content_str)}")
-        parsed_data = parse_race_file(content_str)
+        async for line in iter_upload_lines(file):
+            section = splitter.feed_line(line)
+            if section:
+                pending.append(await submit(section))
+                # Hand back finished sections (in order) and cap the sections in flight
+                while pending and (len(pending) >= max_in_flight or pending[0].done()):
+                    for block in await pending.popleft():
+                        yield block
         
-        processed_races = []
-        processed_results = []
+        section = splitter.close()
+        if section:
+            pending.append(await submit(section))
+        while pending:
+            for block in await pending.popleft():
+                yield block
+    except BrokenProcessPool:
+        logger.error(f"Parse worker died while parsing {file.filename}, restarting the parse pool")
+        discard_parse_executor(executor)
+        raise
+
+async def store_race_block(race_data: Dict[str, Any], total_pigeons_override: Optional[int] = None):
+    """Persist one parsed race block, returns the race and the results created for it.
+
+    The block's results are per-column lists (see race_parser.build_result_columns),
+    they are turned straight into result documents.
+    """
+    race_info = race_data['race']
+    results = race_data['results']
+    
+    # Use override if provided, otherwise use parsed value
+    if total_pigeons_override:
+        race_info['total_pigeons'] = total_pigeons_override
+    
+    logger.debug("Processing race: %s", race_info)
+    
+    # Create the race unless it already exists, in one atomic upsert backed by the
+    # unique race index so concurrent uploads can't create the same race twice
+    race_query = race_lookup_query(race_info)
+    new_race = prepare_for_mongo(Race(**race_info).dict())
+    try:
+        race_doc = await db.races.find_one_and_update(
+            race_query,
+            {"$setOnInsert": {k: v for k, v in new_race.items() if k not in race_query}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race against a concurrent upload, the race exists now
+        race_doc = await db.races.find_one(race_query)
+    race_obj = Race(**parse_from_mongo(race_doc))
+    
+    if race_obj.id == new_race['id']:
+        logger.info(f"Created new race: {race_obj.id}")
+    else:
+        logger.info(f"Race already exists: {race_obj.id}")
+    
+    # Calculate coefficients with correct formula using the confirmed total (not parsed total).
+    # Use the race's total_pigeons which should be the confirmed count if overridden,
+    # max 5000 pigeons in race. If no total, just use position * 100
+    coefficient_divisor = min(race_obj.total_pigeons, 5000) or 1
+    
+    # Resolve registered pigeons with one query instead of a lookup per row. Results
+    # already stored for this race are rejected by the unique (race_id, ring_number) index
+    ring_numbers = list(set(results['ring_number']))
+    pigeons = await db.pigeons.find(
+        {"ring_number": {"$in": ring_numbers}},
+        {"ring_number": 1, "id": 1}
+    ).to_list(None)
+    pigeon_ids = {pigeon['ring_number']: pigeon['id'] for pigeon in pigeons}
+    
+    processed_results = []
+    unclaimed_results = []
+    seen_rings = set()
+    duplicate_rings = []
+    already_stored = 0
+    created_at = datetime.now(timezone.utc).isoformat()
+    
+    # Per-row records are debug only and sampled, the race gets one summary record
+    log_rows = logger.isEnabledFor(logging.DEBUG)
+    
+    # Create race result documents (RaceResult fields) with robust duplicate prevention
+    rows = zip(*(results[column] for column in RESULT_COLUMNS))
+    for index, (position, ring_number, owner_name, city, distance, time, speed) in enumerate(rows):
+        if log_rows and index % ROW_LOG_SAMPLE_RATE == 0:
+            logger.debug("Processing result %d of race %s: %s %s %s", index + 1, race_obj.id,
+                         position, ring_number, owner_name)
         
-        for race_data in parsed_data['races']:
-            race_info = race_data['race']
-            results = race_data['results']
-            
-            # Use override if provided, otherwise use parsed value
-            if total_pigeons_override:
-                race_info['total_pigeons'] = total_pigeons_override
-            
-            logger.info(f"Processing race: {race_info}")
-            
-            # Check if this race already exists to prevent duplicate races
-            existing_race = await db.races.find_one({
-                "race_name": race_info['race_name'],
-                "date": race_info['date'],
-                "organization": race_info['organization'],
-                "category": race_info['category']
+        # Skip if this pigeon already has a result for this race in this file
+        if ring_number in seen_rings:
+            duplicate_rings.append(ring_number)
+            continue
+        seen_rings.add(ring_number)
+        
+        # Results of registered pigeons are stored, the others are kept aside by
+        # ring number until the pigeon is registered
+        pigeon_id = pigeon_ids.get(ring_number)
+        result_doc = {
+            "id": str(uuid.uuid4()),
+            "race_id": race_obj.id,
+            "pigeon_id": pigeon_id,
+            "ring_number": ring_number,
+            "owner_name": owner_name,
+            "city": city,
+            "position": position,
+            "distance": distance,
+            "time": time,
+            "speed": speed,
+            "coefficient": position * 100 / coefficient_divisor,
+            "created_at": created_at
+        }
+        if pigeon_id:
+            processed_results.append(result_doc)
+        else:
+            unclaimed_results.append(result_doc)
+    
+    if processed_results:
+        # Results stored by an earlier or concurrent upload are duplicate key
+        # errors, drop them from what this upload created
+        rejected = await insert_new_results(db.race_results, processed_results)
+        if rejected:
+            processed_results = [r for i, r in enumerate(processed_results) if i not in rejected]
+            already_stored = len(rejected)
+        await add_to_pigeon_stats(processed_results)
+    if unclaimed_results:
+        await insert_new_results(db.unclaimed_results, unclaimed_results)
+    
+    if duplicate_rings:
+        logger.warning(f"Skipped {len(duplicate_rings)} duplicate rows in race {race_obj.id}, "
+                       f"rings {', '.join(duplicate_rings[:5])}{'...' if len(duplicate_rings) > 5 else ''}")
+    logger.info(f"Stored race {race_obj.id} ({race_obj.race_name} {race_obj.date}): "
+                f"{len(processed_results)} results, {len(unclaimed_results)} unregistered, "
+                f"{already_stored} already stored")
+    
+    # Remember how far this race has been ingested for republished versions of the file
+    if results['position']:
+        await db.races.update_one(
+            {"id": race_obj.id},
+            {"$max": {"last_position": max(results['position'])}}
+        )
+    bump_versions("races", "race_results")
+    
+    return race_obj, processed_results
+
+async def insert_new_results(collection, results: List[Dict[str, Any]]) -> set:
+    """Insert result documents, skipping the ones the collection's unique index already holds.
+
+    Returns the indexes of the results that were skipped as duplicates.
+    """
+    try:
+        await collection.insert_many(results, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return {error['index'] for error in errors}
+    return set()
+
+# pigeon_stats holds per ring running totals of its race results. Inserted results
+# are added with $inc/$max, after deletes the affected rings are recomputed since
+# a best speed can't be taken back
+def pigeon_stats_from_totals(totals: Optional[Dict[str, Any]]) -> PigeonStats:
+    if not totals or not totals.get('total_races'):
+        return PigeonStats(total_races=0, total_wins=0, win_rate=0.0, best_speed=0.0,
+                           avg_placement=0.0, total_distance=0)
+    total_races = totals['total_races']
+    placed_races = totals.get('placed_races', 0)
+    return PigeonStats(
+        total_races=total_races,
+        total_wins=totals['total_wins'],
+        win_rate=(totals['total_wins'] / total_races) * 100,
+        best_speed=totals.get('best_speed', 0.0),
+        avg_placement=totals.get('position_sum', 0) / placed_races if placed_races else 0.0,
+        total_distance=totals['total_distance']
+    )
+
+async def add_to_pigeon_stats(results: List[Dict[str, Any]]):
+    """Count newly inserted result documents in their rings' stats"""
+    totals = {}
+    for result in results:
+        ring_totals = totals.setdefault(result['ring_number'], {
+            "total_races": 0, "total_wins": 0, "placed_races": 0, "position_sum": 0,
+            "total_distance": 0, "best_speed": 0.0
+        })
+        ring_totals['total_races'] += 1
+        ring_totals['total_wins'] += result['position'] == 1
+        if result['position'] > 0:
+            ring_totals['placed_races'] += 1
+            ring_totals['position_sum'] += result['position']
+        ring_totals['total_distance'] += result['distance']
+        ring_totals['best_speed'] = max(ring_totals['best_speed'], result['speed'])
+    
+    if totals:
+        await db.pigeon_stats.bulk_write([
+            UpdateOne(
+                {"ring_number": ring_number},
+                {"$inc": {k: v for k, v in ring_totals.items() if k != 'best_speed'},
+                 "$max": {"best_speed": ring_totals['best_speed']}},
+                upsert=True
+            )
+            for ring_number, ring_totals in totals.items()
+        ], ordered=False)
+
+async def rebuild_pigeon_stats(ring_numbers: Optional[List[str]] = None) -> int:
+    """Recompute the stats of the given rings (all rings when None) from their results"""
+    pipeline = [
+        {"$group": {
+            "_id": "$ring_number",
+            "total_races": {"$sum": 1},
+            "total_wins": {"$sum": {"$cond": [{"$eq": ["$position", 1]}, 1, 0]}},
+            "placed_races": {"$sum": {"$cond": [{"$gt": ["$position", 0]}, 1, 0]}},
+            "position_sum": {"$sum": {"$cond": [{"$gt": ["$position", 0]}, "$position", 0]}},
+            "total_distance": {"$sum": "$distance"},
+            "best_speed": {"$max": {"$cond": [{"$gt": ["$speed", 0]}, "$speed", 0.0]}}
+        }}
+    ]
+    if ring_numbers is not None:
+        ring_numbers = list(set(ring_numbers))
+        if not ring_numbers:
+            return 0
+        pipeline.insert(0, {"$match": {"ring_number": {"$in": ring_numbers}}})
+    
+    operations = []
+    rebuilt = set()
+    async for totals in db.race_results.aggregate(pipeline):
+        ring_number = totals.pop('_id')
+        rebuilt.add(ring_number)
+        operations.append(ReplaceOne({"ring_number": ring_number}, {"ring_number": ring_number, **totals}, upsert=True))
+    
+    # Rings left without results lose their stats
+    if ring_numbers is None:
+        await db.pigeon_stats.delete_many({"ring_number": {"$nin": list(rebuilt)}})
+    else:
+        operations.extend(DeleteOne({"ring_number": ring_number}) for ring_number in ring_numbers if ring_number not in rebuilt)
+    if operations:
+        await db.pigeon_stats.bulk_write(operations, ordered=False)
+    return len(rebuilt)
+
+async def claim_unclaimed_results(pigeon_id: str, ring_number: str) -> int:
+    """Attach results uploaded before the pigeon was registered, returns how many were attached"""
+    unclaimed = await db.unclaimed_results.find({"ring_number": ring_number}).to_list(None)
+    if not unclaimed:
+        return 0
+    
+    results = [{**without_object_id(doc), "pigeon_id": pigeon_id} for doc in unclaimed]
+    rejected = await insert_new_results(db.race_results, results)
+    await add_to_pigeon_stats([r for i, r in enumerate(results) if i not in rejected])
+    bump_versions("race_results")
+    # Only the documents read here, a concurrent upload may have added more since
+    await db.unclaimed_results.delete_many({"_id": {"$in": [doc["_id"] for doc in unclaimed]}})
+    claimed = len(results) - len(rejected)
+    logger.info(f"Attached {claimed} earlier race results to pigeon {ring_number}")
+    return claimed
+
+async def hash_upload(file: UploadFile) -> str:
+    """sha256 of an uploaded file, read in chunks and rewound afterwards"""
+    digest = hashlib.sha256()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+async def iter_blocks(blocks: List[Dict[str, Any]]):
+    for block in blocks:
+        yield block
+
+async def persist_race_blocks(blocks, total_pigeons_override: Optional[int] = None,
+                              report_progress: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Store parsed race blocks from an async iterable, returns the upload outcome and the race ids.
+
+    report_progress, when given, is awaited after every stored race with the
+    races parsed, rows persisted and rows skipped so far.
+    """
+    races_count = 0
+    results_count = 0
+    skipped_rows = 0
+    rows_not_persisted = 0
+    parsed_pigeon_counts = []
+    race_ids = []
+    
+    async for race_data in blocks:
+        race_obj, race_results = await store_race_block(race_data, total_pigeons_override)
+        races_count += 1
+        results_count += len(race_results)
+        skipped_rows += race_data['skipped_rows']
+        rows_not_persisted += count_results(race_data) - len(race_results)
+        parsed_pigeon_counts.append(race_data['race']['total_pigeons'])
+        race_ids.append(race_obj.id)
+        if report_progress:
+            await report_progress({
+                "races_parsed": races_count,
+                "rows_persisted": results_count,
+                "rows_skipped": skipped_rows + rows_not_persisted
             })
+    
+    outcome = {
+        "message": f"Successfully processed {races_count} races with {results_count} results",
+        "races": races_count,
+        "results": results_count,
+        "already_ingested_rows": skipped_rows,
+        "needs_pigeon_count_confirmation": total_pigeons_override is None,
+        "parsed_pigeon_counts": parsed_pigeon_counts
+    }
+    return outcome, race_ids
+
+async def record_upload(content_hash: str, filename: str, total_pigeons_override: Optional[int],
+                        race_ids: List[str], outcome: Dict[str, Any]):
+    uploaded_file = UploadedFile(
+        content_hash=content_hash,
+        filename=filename,
+        total_pigeons_override=total_pigeons_override,
+        race_ids=race_ids,
+        outcome=outcome
+    )
+    await db.uploaded_files.insert_one(prepare_for_mongo(uploaded_file.dict()))
+
+async def ingest_upload(file: UploadFile, total_pigeons_override: Optional[int] = None,
+                        report_progress: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None) -> Dict[str, Any]:
+    """Parse and store an uploaded result file, returns the upload outcome"""
+    # An identical file with the same override gives the same outcome, return it
+    # without parsing the file again
+    content_hash = await hash_upload(file)
+    previous_upload = await db.uploaded_files.find_one({
+        "content_hash": content_hash,
+        "total_pigeons_override": total_pigeons_override
+    })
+    if previous_upload:
+        logger.info(f"File {file.filename} was already uploaded as {previous_upload['id']}, skipping")
+        return {**previous_upload['outcome'], "duplicate_upload": True}
+    
+    # The file is read and parsed in chunks and each race is stored as soon as
+    # it has been parsed, so only one race block is held in memory at a time
+    outcome, race_ids = await persist_race_blocks(stream_race_blocks(file), total_pigeons_override, report_progress)
+    logger.info(f"Processed file {file.filename}: {outcome['races']} races, {outcome['results']} results")
+    
+    await record_upload(content_hash, file.filename, total_pigeons_override, race_ids, outcome)
+    return outcome
+
+async def preview_upload(file: UploadFile) -> Dict[str, Any]:
+    """Parse an upload without storing anything, the parsed races wait in parsed_uploads for confirmation.
+
+    Parsing stops with a 413 once the file has more than MAX_PREVIEW_ROWS rows,
+    the whole file is held in memory until it is confirmed.
+    """
+    content_hash = await hash_upload(file)
+    blocks = []
+    rows = 0
+    race_blocks = stream_race_blocks(file)
+    try:
+        async for race_data in race_blocks:
+            rows += count_results(race_data)
+            if rows > MAX_PREVIEW_ROWS:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Files of more than {MAX_PREVIEW_ROWS} results can't be previewed, "
+                           f"upload them with total_pigeons_override instead"
+                )
+            blocks.append(race_data)
+    finally:
+        await race_blocks.aclose()
+    token = parsed_uploads.put({
+        "content_hash": content_hash,
+        "filename": file.filename,
+        "blocks": blocks
+    }, rows)
+    logger.info(f"Parsed preview of {file.filename}: {len(blocks)} races")
+    
+    return {
+        "message": f"Parsed {len(blocks)} races, confirm the pigeon count to store them",
+        "preview_token": token,
+        "races": len(blocks),
+        "results": rows,
+        "needs_pigeon_count_confirmation": True,
+        "parsed_pigeon_counts": [race_data['race']['total_pigeons'] for race_data in blocks],
+        "expires_in": PREVIEW_TTL_SECONDS
+    }
+
+async def commit_preview(preview_token: str, confirmed_pigeon_count: Optional[int]) -> Dict[str, Any]:
+    """Store the races of a parsed preview with the confirmed pigeon count"""
+    preview = parsed_uploads.pop(preview_token)
+    if preview is None:
+        raise HTTPException(status_code=404, detail="Upload preview not found or expired, upload the file again")
+    
+    outcome, race_ids = await persist_race_blocks(iter_blocks(preview['blocks']), confirmed_pigeon_count)
+    logger.info(f"Committed preview of {preview['filename']}: {outcome['races']} races, {outcome['results']} results")
+    
+    await record_upload(preview['content_hash'], preview['filename'], confirmed_pigeon_count, race_ids, outcome)
+    return outcome
+
+async def spool_upload(file: UploadFile) -> UploadFile:
+    """Copy an upload to a file we own, the request's file is closed once the response is sent"""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        spool.write(chunk)
+    spool.seek(0)
+    return UploadFile(file=spool, filename=file.filename)
+
+async def queue_upload_job(file: UploadFile, total_pigeons_override: Optional[int] = None) -> UploadJob:
+    """Hand an upload to the background workers, returns the queued job"""
+    if upload_queue is None or upload_queue.full():
+        raise HTTPException(status_code=503, detail="Upload queue is full, try again later")
+    
+    job = UploadJob(filename=file.filename, total_pigeons_override=total_pigeons_override)
+    spool = await spool_upload(file)
+    try:
+        await db.upload_jobs.insert_one(prepare_for_mongo(job.dict()))
+        # The queue may have filled up while the file was copied
+        upload_queue.put_nowait((job.id, spool, total_pigeons_override))
+    except asyncio.QueueFull:
+        await spool.close()
+        await update_upload_job(job.id, status="failed", error="Upload queue is full, try again later")
+        raise HTTPException(status_code=503, detail="Upload queue is full, try again later")
+    except BaseException:
+        await spool.close()
+        raise
+    logger.info(f"Queued upload job {job.id} for {file.filename}")
+    return job
+
+async def update_upload_job(job_id: str, **fields):
+    fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+    await db.upload_jobs.update_one({"id": job_id}, {"$set": fields})
+
+async def run_upload_jobs():
+    """Background worker ingesting queued uploads one at a time"""
+    while True:
+        job_id, file, total_pigeons_override = await upload_queue.get()
+        try:
+            await update_upload_job(job_id, status="running")
             
-            if existing_race:
-                logger.info(f"Race already exists: {existing_race['id']}")
-                race_obj = Race(**parse_from_mongo(existing_race))
-                processed_races.append(race_obj)
-            else:
-                # Create new race
-                race_obj = Race(**race_info)
-                race_dict = prepare_for_mongo(race_obj.dict())
-                await db.races.insert_one(race_dict)
-                processed_races.append(race_obj)
-                logger.info(f"Created new race: {race_obj.id}")
+            async def report_progress(progress):
+                await update_upload_job(job_id, **progress)
             
-            # Create race results with robust duplicate prevention
-            for result in results:
-                logger.info(f"Processing result: {result}")
-                
-                ring_number = result['ring_number'].strip()
-                
-                # Check if this pigeon already has a result for this race (using race_id)
-                existing_result = await db.race_results.find_one({
-                    "race_id": race_obj.id,
-                    "ring_number": ring_number
-                })
-                
-                if existing_result:
-                    logger.warning(f"Skipping duplicate result for ring {ring_number} in race {race_obj.id}")
-                    continue
-                
-                # Recalculate coefficient with correct formula using the confirmed total (not parsed total)
-                # Use the race's total_pigeons which should be the confirmed count if overridden
-                actual_total_pigeons = min(race_obj.total_pigeons, 5000)  # Use race object's total, max 5000 pigeons in race
-                if actual_total_pigeons > 0:
-                    coefficient = (result['position'] * 100) / actual_total_pigeons
-                else:
-                    coefficient = result['position'] * 100  # If no total, just use position * 100
-                
-                # Try to find matching pigeon in our database
-                pigeon = await db.pigeons.find_one({"ring_number": ring_number})
-                pigeon_id = pigeon['id'] if pigeon else None
-                
-                # Only create result if pigeon exists in our database
-                if pigeon_id:
-                    result_obj = RaceResult(
-                        race_id=race_obj.id,
-                        pigeon_id=pigeon_id,
-                        ring_number=ring_number,  # Use cleaned ring number
-                        coefficient=coefficient,  # Use recalculated coefficient
-                        **{k: v for k, v in result.items() if k not in ['coefficient', 'ring_number']}
-                    )
-                    result_dict = prepare_for_mongo(result_obj.dict())
-                    await db.race_results.insert_one(result_dict)
-                    processed_results.append(result_obj)
-                    logger.info(f"Created result for registered pigeon {ring_number}")
-                else:
-                    logger.info(f"Skipping result for unregistered pigeon {ring_number}")
-        
-        return {
-            "message": f"Successfully processed {len(processed_races)} races with {len(processed_results)} results",
-            "races": len(processed_races),
-            "results": len(processed_results),
-            "needs_pigeon_count_confirmation": total_pigeons_override is None,
-            "parsed_pigeon_counts": [race_data['race']['total_pigeons'] for race_data in parsed_data['races']]
-        }
+            summary = await ingest_upload(file, total_pigeons_override, report_progress)
+            await update_upload_job(job_id, status="completed", summary=summary)
+        except Exception as e:
+            logger.error(f"Upload job {job_id} failed: {str(e)}", exc_info=True)
+            # The worker must outlive a failed status write (e.g. while Mongo is down),
+            # or every later job stays queued
+            try:
+                await update_upload_job(job_id, status="failed", error=f"Error processing file: {str(e)}")
+            except Exception as update_error:
+                logger.error(f"Could not mark upload job {job_id} as failed: {str(update_error)}", exc_info=True)
+        finally:
+            await file.close()
+            upload_queue.task_done()
+
+@api_router.post("/upload-race-results")
+async def upload_race_results(file: UploadFile = File(...), total_pigeons_override: Optional[int] = None,
+                              background: bool = False, preview: bool = False):
+    if not file.filename.endswith('.txt'):
+        raise HTTPException(status_code=400, detail="Only TXT files are allowed")
+    
+    # Preview mode: parse only and return a token for /api/confirm-race-upload
+    if preview:
+        try:
+            return await preview_upload(file)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing file: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    
+    # Job mode: accept the file now and process it in the background,
+    # progress is polled with GET /api/upload-jobs/{job_id}
+    if background:
+        job = await queue_upload_job(file, total_pigeons_override)
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+    
+    try:
+        return await ingest_upload(file, total_pigeons_override)
     
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
+class UnpackBudget:
+    """Bytes the files of one batch upload may still unpack to.
+
+    Shared by the extraction threads of the batch, so taking bytes is locked.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.remaining = max_bytes
+        self.lock = threading.Lock()
+
+    def take(self, size: int, filename: str):
+        with self.lock:
+            if size > self.remaining:
+                raise ValueError(f"{filename} unpacks to more than the batch upload limit of {MAX_UNPACKED_BATCH_SIZE} bytes")
+            self.remaining -= size
+
+def extract_result_files(spool, filename: str, budget: UnpackBudget) -> List[Tuple[str, Any]]:
+    """Unpack a .txt, .txt.gz or .zip upload into (filename, file) pairs of result files.
+
+    Zip members that aren't .txt or .txt.gz files are left out. Every result file is
+    at most MAX_UNPACKED_FILE_SIZE bytes and all of them count against the budget of
+    the batch; sizes are counted while copying, headers of compressed files can lie.
+    Runs in a thread, decompressing is blocking.
+    """
+    def copy_limited(source, name: str) -> Any:
+        target = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY)
+        try:
+            size = 0
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UNPACKED_FILE_SIZE:
+                    raise ValueError(f"{name} unpacks to more than {MAX_UNPACKED_FILE_SIZE} bytes")
+                budget.take(len(chunk), name)
+                target.write(chunk)
+        except Exception:
+            target.close()
+            raise
+        target.seek(0)
+        return target
+    
+    def decompress(source, name: str) -> Any:
+        with gzip.GzipFile(fileobj=source, mode='rb') as gz:
+            return copy_limited(gz, name)
+    
+    def copy_member(archive: zipfile.ZipFile, member: zipfile.ZipInfo, name: str) -> Any:
+        if member.file_size > MAX_UNPACKED_FILE_SIZE:
+            raise ValueError(f"{name} unpacks to more than {MAX_UNPACKED_FILE_SIZE} bytes")
+        with archive.open(member) as source:
+            return copy_limited(source, name)
+    
+    name = filename.lower()
+    if name.endswith('.txt'):
+        spool.seek(0, io.SEEK_END)
+        size = spool.tell()
+        spool.seek(0)
+        try:
+            if size > MAX_UNPACKED_FILE_SIZE:
+                raise ValueError(f"{filename} is larger than {MAX_UNPACKED_FILE_SIZE} bytes")
+            budget.take(size, filename)
+        except Exception:
+            spool.close()
+            raise
+        return [(filename, spool)]
+    if name.endswith('.txt.gz'):
+        try:
+            return [(filename[:-3], decompress(spool, filename[:-3]))]
+        finally:
+            spool.close()
+    if name.endswith('.zip'):
+        extracted = []
+        try:
+            with zipfile.ZipFile(spool) as archive:
+                for member in archive.infolist():
+                    member_name = member.filename.lower()
+                    if member.is_dir() or not member_name.endswith(('.txt', '.txt.gz')):
+                        continue
+                    member_file = copy_member(archive, member, f"{filename}/{member.filename}")
+                    if member_name.endswith('.gz'):
+                        with member_file:
+                            result_name = f"{filename}/{member.filename[:-3]}"
+                            extracted.append((result_name, decompress(member_file, result_name)))
+                    else:
+                        extracted.append((f"{filename}/{member.filename}", member_file))
+        except Exception:
+            for _, member_file in extracted:
+                member_file.close()
+            raise
+        finally:
+            spool.close()
+        return extracted
+    spool.close()
+    raise ValueError("Only TXT, TXT.GZ and ZIP files are allowed")
+
+async def ingest_batch_file(file: UploadFile, total_pigeons_override: Optional[int],
+                            limit: asyncio.Semaphore, budget: UnpackBudget) -> List[Dict[str, Any]]:
+    """Unpack and ingest one file of a batch upload, returns a summary per result file"""
+    async with limit:
+        try:
+            spool = await spool_upload(file)
+            result_files = await asyncio.to_thread(extract_result_files, spool.file, file.filename, budget)
+        except Exception as e:
+            logger.error(f"Error processing file {file.filename}: {str(e)}", exc_info=True)
+            return [{"filename": file.filename, "status": "failed", "error": f"Error processing file: {str(e)}"}]
+    
+    async def ingest(filename: str, result_file) -> Dict[str, Any]:
+        upload = UploadFile(file=result_file, filename=filename)
+        async with limit:
+            try:
+                outcome = await ingest_upload(upload, total_pigeons_override)
+                return {"filename": filename, "status": "completed", **outcome}
+            except Exception as e:
+                logger.error(f"Error processing file {filename}: {str(e)}", exc_info=True)
+                return {"filename": filename, "status": "failed", "error": f"Error processing file: {str(e)}"}
+            finally:
+                await upload.close()
+    
+    summaries = await asyncio.gather(*(ingest(filename, result_file) for filename, result_file in result_files))
+    if not summaries:
+        return [{"filename": file.filename, "status": "failed", "error": "No result files found"}]
+    return list(summaries)
+
+@api_router.post("/upload-race-results/batch")
+async def upload_race_results_batch(files: List[UploadFile] = File(...), total_pigeons_override: Optional[int] = None):
+    """Upload several result files at once, as .txt, .txt.gz or .zip archives of them.
+
+    Files are ingested BATCH_UPLOAD_CONCURRENCY at a time through the normal
+    upload pipeline. A failing file doesn't stop the others, every result file
+    gets its own summary. Files unpacking past MAX_UNPACKED_FILE_SIZE, or past
+    MAX_UNPACKED_BATCH_SIZE for the whole batch, fail.
+    """
+    limit = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    budget = UnpackBudget(MAX_UNPACKED_BATCH_SIZE)
+    per_upload = await asyncio.gather(*(ingest_batch_file(file, total_pigeons_override, limit, budget)
+                                        for file in files))
+    summaries = [summary for upload_summaries in per_upload for summary in upload_summaries]
+    completed = [summary for summary in summaries if summary['status'] == "completed"]
+    
+    return {
+        "message": f"Processed {len(completed)} of {len(summaries)} files",
+        "races": sum(summary['races'] for summary in completed),
+        "results": sum(summary['results'] for summary in completed),
+        "files": summaries
+    }
+
+@api_router.get("/upload-jobs/{job_id}", response_model=UploadJob)
+async def get_upload_job(job_id: str):
+    job = await db.upload_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return UploadJob(**parse_from_mongo(job))
+
 @api_router.post("/confirm-race-upload")
-async def confirm_race_upload(file: UploadFile = File(...), confirmed_pigeon_count: int = 0):
-    """Confirm race upload with specified pigeon count"""
+async def confirm_race_upload(file: Optional[UploadFile] = File(None), confirmed_pigeon_count: int = 0,
+                              preview_token: Optional[str] = None):
+    """Confirm race upload with specified pigeon count.
+
+    With a preview_token the races parsed by a preview upload are stored, without
+    sending or parsing the file again. Otherwise the file is uploaded again.
+    """
+    if preview_token:
+        try:
+            return await commit_preview(preview_token, confirmed_pigeon_count or None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing file: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    if file is None:
+        raise HTTPException(status_code=400, detail="Send the file or the preview_token of a preview upload")
     return await upload_race_results(file, confirmed_pigeon_count)
 
-@api_router.get("/race-results", response_model=List[RaceResultWithDetails])
-async def get_race_results(limit: int = 50):
-    # Get all results and then filter for ones with matching pigeons
-    results = await db.race_results.find().sort("created_at", -1).limit(limit).to_list(limit)
+@api_router.get("/race-results", response_model=Union[NormalizedRaceResults, List[RaceResultWithDetails]])
+async def get_race_results(response: Response, limit: int = 50, cursor: Optional[str] = None,
+                           normalized: bool = False):
+    """Newest results with their pigeon and race, in one aggregation.
+
+    A full page sets the X-Next-Cursor header, pass it as cursor to get the next page.
+    With normalized=true the rows don't embed their pigeon and race, they are sent
+    once each in the races and pigeons maps keyed by id.
+    """
+    limit = page_size(limit)
+    # Results are joined with their pigeon and race before the limit, so results
+    # without a matching pigeon don't make the page come back short
+    pipeline = [
+        {"$match": {"pigeon_id": {"$ne": None}, **cursor_query(cursor, NEWEST_FIRST)}},
+        {"$sort": {"created_at": -1, "id": -1}},
+        {"$lookup": {"from": "pigeons", "localField": "pigeon_id", "foreignField": "id", "as": "pigeon"}},
+        {"$unwind": "$pigeon"},
+        {"$lookup": {"from": "races", "localField": "race_id", "foreignField": "id", "as": "race"}},
+        {"$unwind": "$race"},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "pigeon._id": 0, "pigeon.search_grams": 0, "race._id": 0}}
+    ]
+    results = await db.race_results.aggregate(pipeline).to_list(limit)
+    set_next_cursor(response, results, limit, NEWEST_FIRST)
+    
+    if normalized:
+        races = {}
+        pigeons = {}
+        rows = []
+        for result in results:
+            race = result.pop('race')
+            pigeon = result.pop('pigeon')
+            if race['id'] not in races:
+                races[race['id']] = Race(**parse_from_mongo(race))
+            if pigeon['id'] not in pigeons:
+                pigeons[pigeon['id']] = Pigeon(**parse_from_mongo(pigeon))
+            rows.append(RaceResult(**parse_from_mongo(result)))
+        return NormalizedRaceResults(results=rows, races=races, pigeons=pigeons)
     
     detailed_results = []
     for result in results:
-        result_obj = RaceResult(**parse_from_mongo(result))
-        
-        # Get associated pigeon and race
-        pigeon = None
-        race = None
-        
-        if result_obj.pigeon_id:
-            pigeon_data = await db.pigeons.find_one({"id": result_obj.pigeon_id})
-            if pigeon_data:
-                pigeon = Pigeon(**parse_from_mongo(pigeon_data))
-        
-        race_data = await db.races.find_one({"id": result_obj.race_id})
-        if race_data:
-            race = Race(**parse_from_mongo(race_data))
-        
-        # Only include results that have matching pigeons in our database
-        if pigeon and race:
-            detailed_result = RaceResultWithDetails(
-                **result_obj.dict(),
-                pigeon=pigeon,
-                race=race
-            )
-            detailed_results.append(detailed_result)
+        pigeon = Pigeon(**parse_from_mongo(result.pop('pigeon')))
+        race = Race(**parse_from_mongo(result.pop('race')))
+        detailed_results.append(RaceResultWithDetails(**result, pigeon=pigeon, race=race))
     
     return detailed_results
 
 @api_router.get("/pigeon-stats/{ring_number}", response_model=PigeonStats)
 async def get_pigeon_stats(ring_number: str):
-    results = await db.race_results.find({"ring_number": ring_number}).to_list(1000)
-    
-    if not results:
-        return PigeonStats(
-            total_races=0,
-            total_wins=0,
-            win_rate=0.0,
-            best_speed=0.0,
-            avg_placement=0.0,
-            total_distance=0
-        )
+    totals = await db.pigeon_stats.find_one({"ring_number": ring_number})
+    return pigeon_stats_from_totals(totals)
+
+@api_router.post("/pigeon-stats/batch", response_model=PigeonStatsBatch)
+async def get_pigeon_stats_batch(request: PigeonStatsBatchRequest):
+    """Stats of many pigeons at once, by ring number and/or pigeon id"""
+    if len(request.ring_numbers) + len(request.pigeon_ids) > MAX_STATS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_BATCH} pigeons per request")
     
-    total_races = len(results)
-    total_wins = len([r for r in results if r.get('position', 0) == 1])
-    win_rate = (total_wins / total_races) * 100 if total_races > 0 else 0.0
-    speeds = [r.get('speed', 0) for r in results if r.get('speed', 0) > 0]
-    best_speed = max(speeds) if speeds else 0.0
-    positions = [r.get('position', 0) for r in results if r.get('position', 0) > 0]
-    avg_placement = sum(positions) / len(positions) if positions else 0.0
-    total_distance = sum([r.get('distance', 0) for r in results])
+    pigeon_rings = {}
+    if request.pigeon_ids:
+        pigeons = await db.pigeons.find(
+            {"id": {"$in": request.pigeon_ids}},
+            {"id": 1, "ring_number": 1}
+        ).to_list(None)
+        pigeon_rings = {pigeon['id']: pigeon['ring_number'] for pigeon in pigeons}
     
-    return PigeonStats(
-        total_races=total_races,
-        total_wins=total_wins,
-        win_rate=win_rate,
-        best_speed=best_speed,
-        avg_placement=avg_placement,
-        total_distance=total_distance
+    ring_numbers = set(request.ring_numbers) | set(pigeon_rings.values())
+    totals = await db.pigeon_stats.find({"ring_number": {"$in": list(ring_numbers)}}).to_list(None)
+    totals_by_ring = {ring_totals['ring_number']: ring_totals for ring_totals in totals}
+    
+    return PigeonStatsBatch(
+        ring_numbers={ring_number: pigeon_stats_from_totals(totals_by_ring.get(ring_number))
+                      for ring_number in request.ring_numbers},
+        pigeon_ids={pigeon_id: pigeon_stats_from_totals(totals_by_ring.get(pigeon_rings.get(pigeon_id)))
+                    for pigeon_id in request.pigeon_ids}
     )
 
+@api_router.post("/pigeon-stats/rebuild")
+async def rebuild_all_pigeon_stats():
+    """Recompute every pigeon's stats from the stored race results"""
+    rebuilt = await rebuild_pigeon_stats()
+    return {"message": f"Rebuilt stats of {rebuilt} pigeons", "pigeons": rebuilt}
+
 @api_router.delete("/race-results/{result_id}")
 async def delete_race_result(result_id: str):
-    result = await db.race_results.delete_one({"id": result_id})
-    if result.deleted_count == 0:
+    result = await db.race_results.find_one_and_delete({"id": result_id})
+    if not result:
         raise HTTPException(status_code=404, detail="Race result not found")
+    bump_versions("race_results")
+    await invalidate_uploaded_files(result['race_id'])
+    await rebuild_pigeon_stats([result['ring_number']])
     return {"message": "Race result deleted successfully"}
 
+class RaceTotalUpdate(BaseModel):
+    total_pigeons: int
+
+@api_router.put("/races/{race_id}/total-pigeons", response_model=Race)
+async def update_race_total(race_id: str, update: RaceTotalUpdate):
+    """Correct a race's total pigeons and recompute the coefficients of its results"""
+    if update.total_pigeons < 0:
+        raise HTTPException(status_code=400, detail="Total pigeons can't be negative")
+    
+    race = await db.races.find_one_and_update(
+        {"id": race_id},
+        {"$set": {"total_pigeons": update.total_pigeons}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not race:
+        raise HTTPException(status_code=404, detail="Race not found")
+    
+    # Same formula as on upload, recomputed by the database in one pipeline update
+    # per collection instead of rewriting every result, max 5000 pigeons in race
+    actual_total_pigeons = min(update.total_pigeons, 5000)
+    coefficient = {"$multiply": ["$position", 100]}
+    if actual_total_pigeons > 0:
+        coefficient = {"$divide": [coefficient, actual_total_pigeons]}
+    for collection in (db.race_results, db.unclaimed_results):
+        await collection.update_many({"race_id": race_id}, [{"$set": {"coefficient": coefficient}}])
+    bump_versions("races", "race_results")
+    
+    return Race(**parse_from_mongo(race))
+
 @api_router.delete("/races/{race_id}")
 async def delete_race(race_id: str):
     # Delete all race results for this race first
+    ring_numbers = await db.race_results.distinct("ring_number", {"race_id": race_id})
     await db.race_results.delete_many({"race_id": race_id})
+    await rebuild_pigeon_stats(ring_numbers)
+    await db.unclaimed_results.delete_many({"race_id": race_id})
+    await invalidate_uploaded_files(race_id)
     
     # Delete the race
     result = await db.races.delete_one({"id": race_id})
+    bump_versions("races", "race_results")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Race not found")
     return {"message": "Race and all its results deleted successfully"}
 
-@api_router.post("/remove-duplicate-results")
-async def remove_duplicate_results():
-    """Remove duplicate race results for the same pigeon in the same race"""
+async def delete_duplicate_results(collection) -> Tuple[int, int]:
+    """Keep one result per pigeon and race in a results collection.
+
+    Returns how many (race_id, ring_number) groups had duplicates and how many
+    results were removed. The stats of the affected rings are recomputed.
+    """
     # Find all race results grouped by race_id and ring_number
     pipeline = [
         {"$group": {
             "_id": {"race_id": "$race_id", "ring_number": "$ring_number"},
-            "ids": {"$push": "$id"},
+            "ids": {"$push": "$_id"},
             "count": {"$sum": 1}
         }},
         {"$match": {"count": {"$gt": 1}}}
     ]
     
-    duplicates = await db.race_results.aggregate(pipeline).to_list(1000)
-    removed_count = 0
-    
-    for duplicate in duplicates:
-        # Keep the first result, remove the rest
-        ids_to_remove = duplicate["ids"][1:]  # Skip first ID
-        for result_id in ids_to_remove:
-            await db.race_results.delete_one({"id": result_id})
-            removed_count += 1
+    duplicates = await collection.aggregate(pipeline).to_list(None)
+    # Keep the first result of every group, remove the rest
+    ids_to_remove = [doc_id for duplicate in duplicates for doc_id in duplicate["ids"][1:]]
+    if ids_to_remove:
+        await collection.delete_many({"_id": {"$in": ids_to_remove}})
+    if collection is db.race_results:
+        bump_versions("race_results")
+        await rebuild_pigeon_stats([duplicate["_id"]["ring_number"] for duplicate in duplicates])
+    return len(duplicates), len(ids_to_remove)
+
+@api_router.post("/remove-duplicate-results")
+async def remove_duplicate_results():
+    """Remove duplicate race results for the same pigeon in the same race"""
+    duplicates_found, removed_count = await delete_duplicate_results(db.race_results)
     
     return {
         "message": f"Removed {removed_count} duplicate race results",
-        "duplicates_found": len(duplicates),
+        "duplicates_found": duplicates_found,
         "results_removed": removed_count
     }
 
@@ -677,7 +1557,11 @@ async def clear_test_data():
     """Clear all test data from database"""
     races_deleted = await db.races.delete_many({})
     results_deleted = await db.race_results.delete_many({})
+    await db.unclaimed_results.delete_many({})
+    await db.pigeon_stats.delete_many({})
     pigeons_deleted = await db.pigeons.delete_many({})
+    bump_versions("races", "race_results", "pigeons")
+    await invalidate_uploaded_files()
     
     return {
         "message": "Test data cleared successfully",
@@ -692,50 +1576,42 @@ async def get_dashboard_stats():
     total_pigeons = await db.pigeons.count_documents({})
     total_races = await db.races.count_documents({})
     
-    # Count only results that have matching pigeons
-    all_results = await db.race_results.find().to_list(1000)
-    total_results = 0
-    valid_results = []
-    
-    for result in all_results:
-        # Check if pigeon exists
-        if result.get('pigeon_id'):
-            pigeon = await db.pigeons.find_one({"id": result['pigeon_id']})
-            if pigeon:
-                total_results += 1
-                valid_results.append(result)
-    
-    # Calculate wins (position 1) from valid results
-    total_wins = len([r for r in valid_results if r.get('position', 0) == 1])
-    
-    # Get top performers (only for pigeons that exist in our database)
+    # Count only results that have matching pigeons, results, wins and top performers
+    # all come from one aggregation with the pigeons joined in
     pipeline = [
         {"$match": {"pigeon_id": {"$ne": None}}},  # Only results with pigeons
-        {"$group": {
-            "_id": "$ring_number",
-            "avg_speed": {"$avg": "$speed"},
-            "total_races": {"$sum": 1},
-            "best_position": {"$min": "$position"}
-        }},
-        {"$match": {"total_races": {"$gte": 1}}},
-        {"$sort": {"avg_speed": -1}},
-        {"$limit": 3}
+        {"$lookup": {"from": "pigeons", "localField": "pigeon_id", "foreignField": "id", "as": "pigeon"}},
+        {"$unwind": "$pigeon"},
+        {"$facet": {
+            "results": [{"$count": "count"}],
+            "wins": [{"$match": {"position": 1}}, {"$count": "count"}],
+            "top_performers": [
+                {"$group": {
+                    "_id": "$ring_number",
+                    "name": {"$first": "$pigeon.name"},
+                    "avg_speed": {"$avg": "$speed"},
+                    "total_races": {"$sum": 1},
+                    "best_position": {"$min": "$position"}
+                }},
+                {"$sort": {"avg_speed": -1}},
+                {"$limit": 3}
+            ]
+        }}
     ]
+    stats = (await db.race_results.aggregate(pipeline).to_list(1))[0]
+    total_results = stats["results"][0]["count"] if stats["results"] else 0
+    total_wins = stats["wins"][0]["count"] if stats["wins"] else 0
     
-    top_performers = await db.race_results.aggregate(pipeline).to_list(3)
-    
-    # Enhance with pigeon details and filter for existing pigeons only
-    enhanced_performers = []
-    for performer in top_performers:
-        pigeon = await db.pigeons.find_one({"ring_number": performer["_id"]})
-        if pigeon:  # Only include if pigeon still exists
-            enhanced_performers.append({
-                "ring_number": performer["_id"],
-                "name": pigeon["name"],
-                "avg_speed": round(performer["avg_speed"], 2),
-                "total_races": performer["total_races"],
-                "best_position": performer["best_position"]
-            })
+    enhanced_performers = [
+        {
+            "ring_number": performer["_id"],
+            "name": performer["name"],
+            "avg_speed": round(performer["avg_speed"], 2),
+            "total_races": performer["total_races"],
+            "best_position": performer["best_position"]
+        }
+        for performer in stats["top_performers"]
+    ]
     
     return {
         "total_pigeons": total_pigeons,
@@ -767,11 +1643,12 @@ async def create_pairing(pairing: PairingCreate):
     pairing_obj = Pairing(**pairing_dict)
     pairing_data = prepare_for_mongo(pairing_obj.dict())
     await db.pairings.insert_one(pairing_data)
+    bump_versions("pairings")
     return pairing_obj
 
 @api_router.get("/pairings", response_model=List[Pairing])
-async def get_pairings():
-    pairings = await db.pairings.find().to_list(1000)
+async def get_pairings(response: Response, limit: int = MAX_PAGE_SIZE, cursor: Optional[str] = None):
+    pairings = await find_page(db.pairings, {}, response, limit, cursor, OLDEST_FIRST)
     return [Pairing(**parse_from_mongo(pairing)) for pairing in pairings]
 
 @api_router.post("/pairings/{pairing_id}/result")
@@ -806,7 +1683,10 @@ async def create_pairing_result(pairing_id: str, result: PairingResultCreate):
     )
     
     pigeon_data = prepare_for_mongo(new_pigeon.dict())
+    pigeon_data['search_grams'] = pigeon_search_grams(pigeon_data)
     await db.pigeons.insert_one(pigeon_data)
+    bump_versions("pigeons")
+    await claim_unclaimed_results(new_pigeon.id, full_ring_number)
     
     # Store pairing result
     result_dict = result.dict()
@@ -838,22 +1718,25 @@ async def create_health_log(log: HealthLogCreate):
     log_obj = HealthLog(**log_dict)
     log_data = prepare_for_mongo(log_obj.dict())
     await db.health_logs.insert_one(log_data)
+    bump_versions("health_logs")
     return log_obj
 
 @api_router.get("/health-logs", response_model=List[HealthLog])
-async def get_health_logs(pigeon_id: Optional[str] = None, type: Optional[str] = None):
+async def get_health_logs(response: Response, pigeon_id: Optional[str] = None, type: Optional[str] = None,
+                          limit: int = MAX_PAGE_SIZE, cursor: Optional[str] = None):
     query = {}
     if pigeon_id:
         query["pigeon_id"] = pigeon_id
     if type:
         query["type"] = type
     
-    logs = await db.health_logs.find(query).sort("date", -1).to_list(1000)
+    logs = await find_page(db.health_logs, query, response, limit, cursor, LOGS_ORDER)
     return [HealthLog(**parse_from_mongo(log)) for log in logs]
 
 @api_router.delete("/health-logs/{log_id}")
 async def delete_health_log(log_id: str):
     result = await db.health_logs.delete_one({"id": log_id})
+    bump_versions("health_logs")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Health log not found")
     return {"message": "Health log deleted successfully"}
@@ -867,22 +1750,25 @@ async def create_loft_log(log: LoftLogCreate):
     log_obj = LoftLog(**log_dict)
     log_data = prepare_for_mongo(log_obj.dict())
     await db.loft_logs.insert_one(log_data)
+    bump_versions("loft_logs")
     return log_obj
 
 @api_router.get("/loft-logs", response_model=List[LoftLog])
-async def get_loft_logs(loft_name: Optional[str] = None, type: Optional[str] = None):
+async def get_loft_logs(response: Response, loft_name: Optional[str] = None, type: Optional[str] = None,
+                        limit: int = MAX_PAGE_SIZE, cursor: Optional[str] = None):
     query = {}
     if loft_name:
         query["loft_name"] = loft_name
     if type:
         query["type"] = type
     
-    logs = await db.loft_logs.find(query).sort("date", -1).to_list(1000)
+    logs = await find_page(db.loft_logs, query, response, limit, cursor, LOGS_ORDER)
     return [LoftLog(**parse_from_mongo(log)) for log in logs]
 
 @api_router.delete("/loft-logs/{log_id}")
 async def delete_loft_log(log_id: str):
     result = await db.loft_logs.delete_one({"id": log_id})
+    bump_versions("loft_logs")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Loft log not found")
     return {"message": "Loft log deleted successfully"}
@@ -890,21 +1776,159 @@ async def delete_loft_log(log_id: str):
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.middleware("http")
+async def cache_responses(request: Request, call_next):
+    """Serve the polled GET endpoints from response_cache until their collections change"""
+    collections = CACHED_ENDPOINTS.get(request.url.path)
+    if request.method != "GET" or collections is None:
+        return await call_next(request)
+    
+    # Versions are read before the response is built, a write during the
+    # request leaves the response cached under the outdated versions
+    key = endpoint_versions(request, collections)
+    cached = response_cache.get(key)
+    if cached is not None:
+        body, status_code, headers = cached
+        return Response(content=body, status_code=status_code, headers=headers)
+    
+    response = await call_next(request)
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = dict(response.headers)
+    if response.status_code == 200:
+        response_cache.put(key, (body, response.status_code, headers))
+    return Response(content=body, status_code=response.status_code, headers=headers)
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """Strong ETags on API GET responses, 304 Not Modified when If-None-Match matches"""
+    if request.method != "GET" or not request.url.path.startswith("/api"):
+        return await call_next(request)
+    
+    if_none_match = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+    collections = VERSIONED_ENDPOINTS.get(request.url.path)
+    
+    if collections is not None:
+        # Read the versions before the response is built, like the response cache
+        etag = make_etag(repr((VERSION_EPOCH, endpoint_versions(request, collections))).encode())
+        if etag in if_none_match:
+            return Response(status_code=304, headers={"ETag": etag})
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers["ETag"] = etag
+        return response
+    
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = dict(response.headers)
+    headers["ETag"] = make_etag(body)
+    if headers["ETag"] in if_none_match:
+        return Response(status_code=304, headers={"ETag": headers["ETag"]})
+    return Response(content=body, status_code=response.status_code, headers=headers)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging. Records are handed to a queue and written by a listener
+# thread, so log I/O doesn't block the event loop
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = QueueListener(log_queue, log_stream_handler, respect_handler_level=True)
+log_queue_handler = QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # The listener's handler adds the rest
+logging.basicConfig(level=LOG_LEVEL, handlers=[log_queue_handler])
+log_listener.start()
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Unique indexes make race and result writes idempotent under concurrent uploads.
+    # When duplicate results stored before the index existed keep it from being built,
+    # they are removed and the index is built again.
+    unique_indexes = [
+        (db.races, [("race_name", 1), ("date", 1), ("organization", 1), ("category", 1)]),
+        (db.races, [("id", 1)]),
+        (db.race_results, [("race_id", 1), ("ring_number", 1)]),
+        (db.race_results, [("id", 1)]),
+        (db.pigeons, [("id", 1)]),
+        (db.unclaimed_results, [("race_id", 1), ("ring_number", 1)]),
+    ]
+    for collection, keys in unique_indexes:
+        try:
+            await collection.create_index(keys, unique=True)
+        except OperationFailure as e:
+            if e.code != DUPLICATE_KEY_ERROR or keys != [("race_id", 1), ("ring_number", 1)]:
+                logger.error(f"Could not create unique index {keys} on {collection.name}: {e}")
+                continue
+            duplicates_found, removed_count = await delete_duplicate_results(collection)
+            logger.warning(f"Removed {removed_count} duplicate results ({duplicates_found} pigeons in a race "
+                           f"more than once) from {collection.name} to build its unique index")
+            try:
+                await collection.create_index(keys, unique=True)
+            except OperationFailure as e:
+                logger.error(f"Could not create unique index {keys} on {collection.name}: {e}")
+    await db.uploaded_files.create_index([("content_hash", 1), ("total_pigeons_override", 1)])
+    await db.uploaded_files.create_index("race_ids")
+    await db.unclaimed_results.create_index("ring_number")
+    await db.race_results.create_index([("created_at", -1), ("id", -1)])
+    # Sort keys of the paged list endpoints
+    await db.pigeons.create_index([("created_at", 1), ("id", 1)])
+    await db.pairings.create_index([("created_at", 1), ("id", 1)])
+    for collection, filter_field in ((db.health_logs, "pigeon_id"), (db.loft_logs, "loft_name")):
+        await collection.create_index([("date", -1), ("id", -1)])
+        await collection.create_index([(filter_field, 1), ("date", -1), ("id", -1)])
+    await db.race_results.create_index("ring_number")
+    await db.pigeon_stats.create_index("ring_number", unique=True)
+    await db.pigeons.create_index("search_grams")
+    # Pigeons stored before search_grams held 1-letter grams
+    if not await db.migrations.find_one({"name": "search_grams_1"}):
+        async for pigeon in db.pigeons.find({}, {"id": 1, **{field: 1 for field in PIGEON_SEARCH_FIELDS}}):
+            await db.pigeons.update_one({"id": pigeon['id']}, {"$set": {"search_grams": pigeon_search_grams(pigeon)}})
+        await db.migrations.insert_one({"name": "search_grams_1", "applied_at": datetime.now(timezone.utc).isoformat()})
+    # First start with pigeon_stats, fill it from the results stored so far. A marker
+    # records the full build, pigeon_stats itself may already hold the stats of rings
+    # the duplicate cleanup recomputed
+    if not await db.migrations.find_one({"name": "pigeon_stats"}):
+        logger.info(f"Built stats of {await rebuild_pigeon_stats()} pigeons")
+        await db.migrations.insert_one({"name": "pigeon_stats", "applied_at": datetime.now(timezone.utc).isoformat()})
+    await db.upload_jobs.create_index("id", unique=True)
+
+@app.on_event("startup")
+async def start_upload_workers():
+    global upload_queue
+    # Jobs don't survive a restart, don't leave them looking like they're still going
+    await db.upload_jobs.update_many(
+        {"status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "failed", "error": "Interrupted by a server restart, upload the file again"}}
+    )
+    upload_queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+    for _ in range(UPLOAD_JOB_WORKERS):
+        upload_workers.append(asyncio.create_task(run_upload_jobs()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def stop_upload_workers():
+    for worker in upload_workers:
+        worker.cancel()
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    # Writes out the records still queued
+    log_listener.stop()
+
+@app.on_event("shutdown")
+async def shutdown_parse_executor():
+    if parse_executor is not None:
+        parse_executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'backend_python'))
+
+from race_parser import (  # noqa: E402
+    RESULT_COLUMNS,
+    DeerlijkParser,
+    count_results,
+    detect_format,
+    iter_sections,
+    parse_race_file,
+    parse_section,
+)
+
+
+def read_fixture(name):
+    return (ROOT_DIR / name).read_text(encoding='utf-8')
+
+
+@pytest.fixture(scope='module')
+def result_new():
+    return read_fixture('result_new.txt')
+
+
+@pytest.fixture(scope='module')
+def result_new_races(result_new):
+    return parse_race_file(result_new)['races']
+
+
+def test_detects_deerlijk_format(result_new):
+    assert detect_format(result_new) is DeerlijkParser
+
+
+def test_race_row_counts(result_new_races):
+    assert [len(block['results']) for block in result_new_races] == [231, 29]
+    assert [block['race']['total_pigeons'] for block in result_new_races] == [462, 58]
+
+
+def test_race_categories(result_new_races):
+    # "Oude+jaarse" is capitalised, both CHIMAY races must still get their own race key
+    assert [block['race']['category'] for block in result_new_races] == ['Jongen', 'oude & jaar']
+
+
+def test_fixed_width_columns(result_new_races):
+    result = result_new_races[0]['results'][5]
+    assert result['position'] == 6
+    assert result['owner_name'] == 'BIELEN TONY'
+    assert result['city'] == 'HASSELT'
+    assert result['distance'] == 127630
+    assert result['ring_number'] == 'BE505259625'
+
+
+def test_ditto_distance_and_tied_positions(result_new_races):
+    results = result_new_races[0]['results']
+    tied = [result for result in results if result['position'] == 228]
+    assert len(tied) == 2
+    assert {result['owner_name'] for result in tied} == {'KNUTS ROGER'}
+    # Both rows only carry a ditto counter, the distance comes from the fancier's first bird
+    assert {result['distance'] for result in tied} == {119280}
+    assert Counter(result['position'] for result in results)[78] == 2
+
+
+def test_sections_parse_like_the_whole_file(result_new, result_new_races):
+    lines = result_new.strip().split('\n')
+    blocks = [block for section in iter_sections(lines, DeerlijkParser)
+              for block in parse_section(section, DeerlijkParser.name)]
+    assert [block['results'] for block in blocks] == [block['results'] for block in result_new_races]
+
+
+def test_after_position_skips_ingested_rows(result_new):
+    lines = result_new.strip().split('\n')
+    sections = [section for section in iter_sections(lines, DeerlijkParser)
+                if parse_section(section, DeerlijkParser.name)]
+    [block] = parse_section(sections[0], DeerlijkParser.name, after_position=200)
+    # Rows at after_position are parsed again, the server's unique index rejects the stored ones
+    assert block['skipped_rows'] == 199
+    assert len(block['results']) == 32
+    assert min(result['position'] for result in block['results']) == 200
+
+
+def test_after_position_keeps_tied_rows(result_new):
+    # A provisional file that ended after the first bird at 228 left last_position at 228
+    lines = result_new.strip().split('\n')
+    sections = [section for section in iter_sections(lines, DeerlijkParser)
+                if parse_section(section, DeerlijkParser.name)]
+    [block] = parse_section(sections[0], DeerlijkParser.name, after_position=228)
+    tied = [result['ring_number'] for result in block['results'] if result['position'] == 228]
+    assert len(tied) == 2
+    assert 'BE505230025' in tied
+
+
+def test_after_position_past_the_end_reports_race_without_results(result_new):
+    lines = result_new.strip().split('\n')
+    sections = [section for section in iter_sections(lines, DeerlijkParser)
+                if parse_section(section, DeerlijkParser.name)]
+    [block] = parse_section(sections[1], DeerlijkParser.name, after_position=30)
+    assert block['results'] == []
+    assert block['skipped_rows'] == 29
+
+
+@pytest.mark.parametrize('name, counts', [
+    ('result_1.txt', [5, 5]),
+    ('sample_race_results.txt', [5]),
+    ('test_race_results.txt', [3]),
+])
+def test_bundled_fixtures(name, counts):
+    races = parse_race_file(read_fixture(name))['races']
+    assert [len(block['results']) for block in races] == counts
+
+
+def test_columnar_blocks_match_row_blocks(result_new, result_new_races):
+    lines = result_new.strip().split('\n')
+    blocks = [block for section in iter_sections(lines, DeerlijkParser)
+              for block in parse_section(section, DeerlijkParser.name, columnar=True)]
+    assert [count_results(block) for block in blocks] == [231, 29]
+    for block, row_block in zip(blocks, result_new_races):
+        rows = [dict(zip(RESULT_COLUMNS, values))
+                for values in zip(*(block['results'][column] for column in RESULT_COLUMNS))]
+        # The coefficient is computed by the server, not the columnar parser
+        assert rows == [{k: v for k, v in result.items() if k != 'coefficient'} for result in row_block['results']]